@@ -3,27 +3,76 @@ Sets up test cases for comparing lik/mcmc/stepsize/predict between python and ma
 """
 
 import numpy as np
-import matlab.engine
 
 from sepia.SepiaData import SepiaData
 from sepia.SepiaModel import SepiaModel
 
+import hashlib
 import os
 import sys
 #root_path = os.path.dirname(sys.modules['__main__'].__file__)
 root_path = os.path.dirname(os.path.realpath(__file__))
 
-
-def setup_univ_sim_only(m=300, seed=42., n_lik=0, n_mcmc=0, n_pred=0, n_lev=0, n_burn=0, sens=0):
+# Set SEPIA_USE_CACHED_MATLAB=1 to load matlab outputs saved by a previous run from data/ instead of starting matlab.engine
+use_cached_matlab = os.environ.get('SEPIA_USE_CACHED_MATLAB', '0') == '1'
+if not use_cached_matlab:
+    import matlab.engine
+
+
+def golden_path(fname, args):
+    key = hashlib.md5(repr(args).encode()).hexdigest()[:12]
+    return os.path.join(root_path, 'data', '%s_%s.npz' % (fname, key))
+
+
+def flatten_res(res, prefix=''):
+    # nested matlab structs -> flat dict of arrays with '/' separated keys
+    flat = {}
+    for k, v in res.items():
+        if isinstance(v, dict):
+            flat.update(flatten_res(v, prefix + k + '/'))
+        else:
+            flat[prefix + k] = np.array(v)
+    return flat
+
+
+def unflatten_res(npz):
+    res = {}
+    for key in npz.files:
+        names = key.split('/')
+        d = res
+        for name in names[:-1]:
+            d = d.setdefault(name, {})
+        d[names[-1]] = npz[key]
+    return res
+
+
+def run_matlab(fname, *args):
+    """
+    Calls matlab setup function fname with args and saves the result as a golden npz in data/,
+    or, if SEPIA_USE_CACHED_MATLAB=1, loads the saved result without starting matlab.
+    """
+    golden = golden_path(fname, args)
+    if use_cached_matlab:
+        with np.load(golden, allow_pickle=True) as npz:
+            return unflatten_res(npz)
+    res = None
     try:
         eng = matlab.engine.start_matlab()
         eng.cd(root_path)
         eng.addpath('matlab/', nargout=0)
-        res = eng.setup_univ_sim_only(m, seed, n_lik, n_mcmc, n_pred, n_lev, n_burn, sens, nargout=1)
+        margs = [matlab.double(a) if isinstance(a, list) else a for a in args]
+        res = getattr(eng, fname)(*margs, nargout=1)
         eng.quit()
     except Exception as e:
         print(e)
         print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    if res is not None:
+        np.savez(golden, **flatten_res(res))
+    return res
+
+
+def setup_univ_sim_only(m=300, seed=42., n_lik=0, n_mcmc=0, n_pred=0, n_lev=0, n_burn=0, sens=0):
+    res = run_matlab('setup_univ_sim_only', m, seed, n_lik, n_mcmc, n_pred, n_lev, n_burn, sens)
     y = np.array(res['y'], dtype=float)
     xt = np.array(res['xt'], dtype=float)
     data = SepiaData(x_sim=xt[:, 0][:, None], t_sim=xt[:, 1][:, None], y_sim=y)
@@ -35,15 +84,7 @@ def setup_univ_sim_only(m=300, seed=42., n_lik=0, n_mcmc=0, n_pred=0, n_lev=0, n
 
 
 def setup_univ_sim_and_obs(m=100, n=50, seed=42., n_lik=0, n_mcmc=0, n_pred=0):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        res = eng.setup_univ_sim_and_obs(m, n, seed, n_lik, n_mcmc, n_pred, nargout=1)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_univ_sim_and_obs', m, n, seed, n_lik, n_mcmc, n_pred)
     y = np.array(res['y'], dtype=float)
     xt = np.array(res['xt'], dtype=float)
     y_obs = np.array(res['y_obs'], dtype=float)
@@ -57,15 +98,7 @@ def setup_univ_sim_and_obs(m=100, n=50, seed=42., n_lik=0, n_mcmc=0, n_pred=0):
 
 
 def setup_multi_sim_only(m=300, nt=20, nx=5, n_pc=10, seed=42., n_lik=0, n_mcmc=0, n_pred=0, fix_K=False, sens=0):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        res = eng.setup_multi_sim_only(m, nt, nx, n_pc, seed, n_lik, n_mcmc, n_pred, sens, nargout=1)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_multi_sim_only', m, nt, nx, n_pc, seed, n_lik, n_mcmc, n_pred, sens)
     y = np.array(res['y'], dtype=float)
     y_ind = np.array(res['y_ind'], dtype=float).squeeze()
     xt = np.array(res['xt'], dtype=float)
@@ -81,15 +114,7 @@ def setup_multi_sim_only(m=300, nt=20, nx=5, n_pc=10, seed=42., n_lik=0, n_mcmc=
 
 
 def setup_multi_sim_and_obs(m=100, n=10, nt_sim=20, nt_obs=15, noise_sd=0.1, nx=5, n_pc=10, seed=42., n_lik=0, n_mcmc=0, n_pred=0, fix_K=False):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        res = eng.setup_multi_sim_and_obs(m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, n_pred, nargout=1)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_multi_sim_and_obs', m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, n_pred)
     y = np.array(res['y'], dtype=float)
     y_ind = np.array(res['y_ind'], dtype=float).squeeze()
     xt = np.array(res['xt'], dtype=float)
@@ -111,15 +136,7 @@ def setup_multi_sim_and_obs(m=100, n=10, nt_sim=20, nt_obs=15, noise_sd=0.1, nx=
 
 
 def setup_multi_sim_and_obs_noD(m=100, n=10, nt_sim=20, nt_obs=15, noise_sd=0.1, nx=5, n_pc=10, seed=42., n_lik=0, n_mcmc=0):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        res = eng.setup_multi_sim_and_obs_noD(m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, nargout=1)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_multi_sim_and_obs_noD', m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc)
     y = np.array(res['y'], dtype=float)
     y_ind = np.array(res['y_ind'], dtype=float).squeeze()
     xt = np.array(res['xt'], dtype=float)
@@ -137,16 +154,8 @@ def setup_multi_sim_and_obs_noD(m=100, n=10, nt_sim=20, nt_obs=15, noise_sd=0.1,
 
 def setup_multi_sim_and_obs_sharedtheta(m=100, n=10, nt_sim=20, nt_obs=15, noise_sd=0.1, nx=5, n_pc=10, seed=42., n_lik=0,
                                         n_mcmc=0, n_pred=0, n_shared=2, clist=[], fix_K=False):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        res = eng.setup_multi_sim_and_obs_sharedtheta(m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, n_pred,
-                                                      n_shared, matlab.double(clist), nargout=1)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_multi_sim_and_obs_sharedtheta', m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, n_pred,
+                     n_shared, clist)
     y = np.array(res['y'], dtype=float) # (m, nt_sim, n_shared)
     y_ind = np.array(res['y_ind'], dtype=float).squeeze() # (nt_sim, n_shared)
     xt = np.array(res['xt'], dtype=float) # (m, nx, n_shared)
@@ -166,16 +175,8 @@ def setup_multi_sim_and_obs_sharedtheta(m=100, n=10, nt_sim=20, nt_obs=15, noise
 
 def setup_multi_sim_and_obs_hiertheta(m=100, n=10, nt_sim=20, nt_obs=15, noise_sd=0.1, nx=5, n_pc=10, seed=42., n_lik=0,
                                         n_mcmc=0, n_pred=0, n_shared=2, fix_K=False):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        res = eng.setup_multi_sim_and_obs_hiertheta(m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, n_pred,
-                                                      n_shared, nargout=1)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_multi_sim_and_obs_hiertheta', m, n, nt_sim, nt_obs, noise_sd, nx, n_pc, seed, n_lik, n_mcmc, n_pred,
+                     n_shared)
     y = np.array(res['y'], dtype=float) # (m, nt_sim, n_shared)
     y_ind = np.array(res['y_ind'], dtype=float).squeeze() # (nt_sim, n_shared)
     xt = np.array(res['xt'], dtype=float) # (m, nx, n_shared)
@@ -194,16 +195,7 @@ def setup_multi_sim_and_obs_hiertheta(m=100, n=10, nt_sim=20, nt_obs=15, noise_s
     return model_list, res
 
 def setup_neddermeyer(seed=42.,n_mcmc=100,sens=1,n_burn=0,n_lev=0):
-    try:
-        eng = matlab.engine.start_matlab()
-        eng.cd(root_path)
-        eng.addpath('matlab/', nargout=0)
-        #dataStruct = eng.neddeg(0, nargout=1)
-        res = eng.setup_neddermeyer(seed,n_mcmc,sens,n_burn,n_lev)
-        eng.quit()
-    except Exception as e:
-        print(e)
-        print('Matlab error; make sure matlab.engine installed, check Matlab code for errors.')
+    res = run_matlab('setup_neddermeyer', seed,n_mcmc,sens,n_burn,n_lev)
     
     # get python model
     import pickle
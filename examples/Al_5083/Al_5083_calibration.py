@@ -1,17 +1,32 @@
+import hashlib
+import multiprocessing
+import os
 import numpy as np
+import pandas as pd
 import pickle
 
 from sepia.SepiaData import SepiaData
 from sepia.SepiaModel import SepiaModel
 
+def load_csv(path):
+    # Parse with pandas' C engine (round_trip keeps values identical to genfromtxt);
+    # the parsed array is cached to .npy so later runs only memory-map it
+    cache = os.path.splitext(path)[0] + '.npy'
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return np.load(cache, mmap_mode='r')
+    arr = pd.read_csv(path, header=0, dtype=np.float64, engine='c', float_precision='round_trip').to_numpy()
+    np.save(cache, arr)
+    return arr
+
 # Load raw data
-sim_s104 = np.genfromtxt('data/features_cdf104S.csv', delimiter=',', skip_header=1)
-sim_s105 = np.genfromtxt('data/features_cdf105S.csv', delimiter=',', skip_header=1)
-sim_s106 = np.genfromtxt('data/features_cdf106S.csv', delimiter=',', skip_header=1)
+sim_s104 = load_csv('data/features_cdf104S.csv')
+sim_s105 = load_csv('data/features_cdf105S.csv')
+sim_s106 = load_csv('data/features_cdf106S.csv')
 
-obs_s104 = np.genfromtxt('data/features_cdf_obs104S.csv', delimiter=',', skip_header=1)
-obs_s105 = np.genfromtxt('data/features_cdf_obs105S.csv', delimiter=',', skip_header=1)
-obs_s106 = np.genfromtxt('data/features_cdf_obs106S.csv', delimiter=',', skip_header=1)
+# obs files hold a single row
+obs_s104 = load_csv('data/features_cdf_obs104S.csv')[0]
+obs_s105 = load_csv('data/features_cdf_obs105S.csv')[0]
+obs_s106 = load_csv('data/features_cdf_obs106S.csv')[0]
 
 design = np.loadtxt('data/Al.trial5.design.txt', skiprows=1)
 with open('data/Al.trial5.design.txt', 'r') as f:
@@ -28,26 +43,86 @@ y_ind = np.arange(1, n_features+1)
 Sigy = np.diag( np.squeeze(0.01 * np.ones(n_features) * y_obs) )
 
 # Set up sepia problem dataset
+n_pc = n_features - 1
 data = SepiaData(t_sim=design, y_sim=y_sim, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind, Sigy=Sigy)
-data.standardize_y()
-data.transform_xt()
-data.create_K_basis(n_features - 1)
+
+# Preprocessed arrays are cached in an npz keyed by a hash of the raw inputs, the cached attribute list and a version tag;
+# bump preproc_version whenever the preprocessing steps below change, so stale cache files are not used
+preproc_version = 'v2'
+preproc_attrs = ['y_std', 'K', 'x_trans', 't_trans', 'orig_y_mean', 'orig_y_sd',
+                 'orig_x_min', 'orig_x_max', 'orig_t_min', 'orig_t_max', 'Sigy_std', 'Sigy_std_chol', 'Sigy_std_logdet']
+raw_hash = hashlib.md5(b''.join([np.ascontiguousarray(a).tobytes()
+                                 for a in (design, y_sim, y_obs, Sigy, data.sim_data.y_ind, data.obs_data.y_ind, np.array([n_pc]))] +
+                                [preproc_version.encode(), ','.join(preproc_attrs).encode()])).hexdigest()
+preproc_file = 'data/_sepia_preproc_%s.npz' % raw_hash
+if os.path.exists(preproc_file):
+    with np.load(preproc_file) as f:
+        for key in f.files:
+            container, attr = key.split('.')
+            val = f[key]
+            setattr(getattr(data, container), attr, val[()] if val.ndim == 0 else val)
+else:
+    data.standardize_y()
+    data.transform_xt()
+    data.create_K_basis(n_pc)
+    preproc = {}
+    for container in ['sim_data', 'obs_data']:
+        for attr in preproc_attrs:
+            val = getattr(getattr(data, container), attr)
+            if val is not None:
+                preproc['%s.%s' % (container, attr)] = val
+    np.savez_compressed(preproc_file, **preproc)
 print(data)
 
-# Setup model
-model = SepiaModel(data)
+# MCMC settings; chains run in parallel, one per seed
+n_mcmc = 10000
+n_chains = 4
+seeds = [42 + i for i in range(n_chains)]
+
+def setup_model():
+    model = SepiaModel(data)
+    # Modify priors to match Matlab
+    model.params.lamWs.prior.bounds[1] = np.inf
+    model.params.lamWs.prior.params = [np.ones((1, 11)), np.zeros((1, 11))]
+    return model
+
+def run_chain(seed):
+    # Module level so it can be used by Pool.map; data is inherited by the forked workers
+    np.random.seed(seed)
+    model = setup_model()
+    model.tune_step_sizes(100, 25, prog=False, verbose=False)
+    model.do_mcmc(n_mcmc, prog=False, seed=seed)
+    return model.get_samples()
+
+def gelman_rubin(chains, key='theta', nburn=0):
+    # Potential scale reduction factor for each column of samples[key] across chains
+    x = np.stack([c[key][nburn:] for c in chains])  # (n_chains, n_samp, n_par)
+    n = x.shape[1]
+    W = np.mean(np.var(x, axis=1, ddof=1), axis=0)
+    B = n * np.var(np.mean(x, axis=1), axis=0, ddof=1)
+    return np.sqrt(((n - 1) / n * W + B / n) / W)
+
+if __name__ == '__main__':
+    # fork start method avoids re-pickling data into each worker (not available on Windows)
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(processes=n_chains) as pool:
+        chains = pool.map(run_chain, seeds)
+    chains_dict = dict(zip(seeds, chains))
+    print('Gelman-Rubin R-hat for theta:', gelman_rubin(chains, nburn=n_mcmc // 2))
 
-# Modify priors to match Matlab
-model.params.lamWs.prior.bounds[1] = np.inf
-model.params.lamWs.prior.params = [np.ones((1, 11)), np.zeros((1, 11))]
+    # Merge chains into one model for downstream use
+    model = setup_model()
+    for c in chains:
+        model.add_samples(c)
+    model.set_model_to_sample()
+    samples_dict = model.get_samples()
 
-# Do mcmc
-model.tune_step_sizes(100, 25)
-model.do_mcmc(10000)
-samples_dict = model.get_samples()
+    # samples are plain float arrays; reload with np.load, which reads each key lazily
+    np.savez_compressed('data/sepia_mcmc_samples%d.npz' % n_mcmc, **samples_dict)
 
-with open('data/sepia_mcmc_samples10000.pkl', 'wb') as f:
-    pickle.dump(samples_dict, f)
+    # per-chain samples keyed as 'seed/param', e.g. '42/theta'
+    np.savez_compressed('data/sepia_mcmc_chains%d.npz' % n_mcmc,
+                        **{'%d/%s' % (seed, k): v for seed, c in chains_dict.items() for k, v in c.items()})
 
-with open('data/sepia_model.pkl', 'wb') as f:
-    pickle.dump(model, f)
\ No newline at end of file
+    with open('data/sepia_model.pkl', 'wb') as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
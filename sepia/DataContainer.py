@@ -1,4 +1,5 @@
 import numpy as np
+import scipy.linalg
 
 
 class DataContainer(object):
@@ -6,14 +7,22 @@ class DataContainer(object):
     DataContainer serves to contain all data structures for a single data source (simulation or observation data).
 
     :var numpy.ndarray/NoneType x: x values, controllable inputs/experimental variables, shape (n, p)
-    :var numpy.ndarray/NoneType y: y values, shape (n, ell)
+    :var numpy.ndarray/list y: y values, shape (n, ell), or list of 1D arrays for ragged observations
+    :var numpy.ndarray/NoneType y_flat: for ragged observations, contiguous buffer of all y values; elements of y are views into it
+    :var numpy.ndarray/NoneType y_offsets: for ragged observations, offsets into y_flat, so y[i] is y_flat[y_offsets[i]:y_offsets[i+1]]
     :var numpy.ndarray/NoneType t: t values, non-controllable inputs, shape (n, q)
     :var numpy.ndarray/NoneType y_ind: indices for multivariate y outputs, shape (ell, )
+    :var numpy.ndarray/NoneType y_ind_flat: for ragged observations, all y_ind concatenated, laid out like y_flat
     :var numpy.ndarray/list/NoneType K: PCA basis, shape (pu, ell), or list of K matrices for each observation (for ragged observations)
+    :var bool K_orthonormal: True if a user-given K was declared (and checked) to have orthonormal rows
     :var numpy.ndarray/list/NoneType D: discrepancy basis, shape (pv, ell), or list of D matrices (for ragged observations)
     :var numpy.ndarray/float/NoneType orig_y_sd: standard deviation of original simulation y values (may be scalar or array, length ell)
     :var numpy.ndarray/float/NoneType orig_y_mean: mean of original simulation y values (may be scalar or array, length ell)
-    :var numpy.ndarray/NoneType y_std: standardized y values, shape (n, ell)
+    :var numpy.ndarray/list/NoneType y_std: standardized y values, shape (n, ell), or list of 1D arrays for ragged observations
+    :var numpy.ndarray/NoneType y_std_flat: for ragged observations, contiguous buffer of standardized y (laid out like y_flat)
+    :var numpy.ndarray/list/NoneType Sigy_std: Sigy scaled by orig_y_sd (identity if no Sigy), or list for ragged observations
+    :var numpy.ndarray/list/NoneType Sigy_std_chol: lower Cholesky factor of Sigy_std, or list for ragged observations
+    :var float/list/NoneType Sigy_std_logdet: log determinant of Sigy_std, or list for ragged observations
     :var numpy.ndarray/NoneType x_trans: x values transformed to unit hypercube, shape (n, p)
     :var numpy.ndarray/NoneType t_trans: t values transformed to unit hypercube, shape (n, q)
     :var numpy.ndarray/NoneType orig_t_min: minimum values (columnwise) of original t values
@@ -21,10 +30,13 @@ class DataContainer(object):
     :var numpy.ndarray/NoneType orig_x_min: minimum values (columnwise) of original x values
     :var numpy.ndarray/NoneType orig_x_max: maximum values (columnwise) of original x values
     :var list/NoneType xt_sep_design: list of separable design component matrices
+    :var numpy.dtype/NoneType dtype: floating point dtype x, y, t are stored in, or None if input dtypes are kept
+    :var numpy.ndarray/list/NoneType Sigy: observation error covariance, shape (ell, ell), or list for ragged observations
+    :var numpy.ndarray/list/NoneType Sigy_chol: lower Cholesky factor of Sigy (computed during validation), or list for ragged observations
 
     """
 
-    def __init__(self, x, y, t=None, y_ind=None, xt_sep_design=None, Sigy=None):
+    def __init__(self, x, y, t=None, y_ind=None, xt_sep_design=None, Sigy=None, dtype=None):
         """
         Initialize DataContainer object.
 
@@ -33,10 +45,14 @@ class DataContainer(object):
         :param numpy.ndarray/NoneType t: optional GP inputs (not controllable, would be known only for sim), shape (n, q)
         :param numpy.ndarray/list/NoneType y_ind: optional y indices (needed if ell > 1) or list of 1D arrays for ragged observations
         :param list/NoneType sep_des: separable Kronecker design
+        :param numpy.dtype/NoneType dtype: optional floating point dtype for x, y, t (e.g. np.float32), or None to keep input dtype;
+                                           Sigy is always kept in float64
 
         .. note:: DataContainer objects are constructed when you instantiate SepiaData and generally won't be instantiated directly.
 
         """
+        self.dtype = dtype
+        self._is_ragged = isinstance(y, list) # fixed at construction; checked in place of isinstance(self.y, list)
         self.x = x
         self.y = y
         self.t = t
@@ -44,9 +60,20 @@ class DataContainer(object):
         self.y_ind = y_ind
         self.Sigy=Sigy
 
-        if isinstance(self.y, list):
-            self.y = [yel.squeeze() for yel in  self.y] # squeeze extra dims if provided
-            self.y_ind = [yel.squeeze() for yel in self.y_ind]  # squeeze extra dims if provided
+        self.y_flat = None
+        self.y_offsets = None
+        if self._is_ragged:
+            # ragged y is held in one contiguous buffer; self.y is a list of views into it (CSR-like layout)
+            y_list = [np.atleast_1d(yel.squeeze()) for yel in self.y] # squeeze extra dims if provided
+            self.y_offsets = np.zeros(len(y_list) + 1, dtype=np.intp)
+            np.cumsum(np.fromiter((yel.shape[0] for yel in y_list), dtype=np.intp, count=len(y_list)), out=self.y_offsets[1:])
+            self.y_flat = np.concatenate(y_list)
+            if self.dtype is not None:
+                self.y_flat = self.y_flat.astype(self.dtype, copy=False)
+            self.y = np.split(self.y_flat, self.y_offsets[1:-1])
+            self.y_ind = [np.ascontiguousarray(yel.squeeze()) for yel in self.y_ind]  # squeeze extra dims if provided
+        elif self.y_ind is not None:
+            self.y_ind = np.ascontiguousarray(self.y_ind) # e.g. a strided slice or pandas Series; searched by every interpolation
         # Parse mandatory inputs (x and y)
         if self.x.shape[0] != len(self.y):
             raise ValueError('Number of observations in x and y must be the same size.')
@@ -57,9 +84,9 @@ class DataContainer(object):
             raise ValueError('y_ind required when y has multivariate output.')
         if self.y_ind is not None:
             if isinstance(self.y_ind, list):
-                y_shapes = np.array([ytmp.shape for ytmp in self.y])
-                y_ind_shapes = np.array([ytmp.shape for ytmp in self.y_ind])
-                if not np.all(y_shapes[:,0] == y_ind_shapes[:,0]):
+                y_lens = np.diff(self.y_offsets)
+                y_ind_lens = np.fromiter((ytmp.shape[0] for ytmp in self.y_ind), dtype=np.intp, count=len(self.y_ind))
+                if not np.array_equal(y_lens, y_ind_lens):
                     raise ValueError('Dimension 1 of y must match dimension 0 of y_ind.')
             else:
                 if self.y.shape[1] != self.y_ind.shape[0]:
@@ -70,43 +97,67 @@ class DataContainer(object):
             if len(self.y) != np.prod([len(g) for g in self.xt_sep_design]):
                 raise ValueError('Number of observations in kron-composed-x and y must be the same size.')
 
-        def val_Sigy(mat,ell_obs):
+        self.y_ind_flat = np.concatenate(self.y_ind) if self._is_ragged else None
+
+        # validates Sigy and returns its lower Cholesky factor, which is kept for reuse
+        def val_Sigy(mat):
             if mat.shape[0] != mat.shape[1]:
                 raise ValueError('Sigy must be square - covariance of observed data')
             try:
-                np.linalg.cholesky(mat)
-            except:
+                return scipy.linalg.cholesky(mat, lower=True, check_finite=False)
+            except np.linalg.LinAlgError:
                 raise ValueError('Sigy seems to not be a valid covariance matrix')
-            if len(self.Sigy) != ell_obs:
-                raise ValueError('Sigy must be the same size as the number of observations')
+        self.Sigy_chol = None
         if self.Sigy is not None:
-            if isinstance(self.y,list):
+            if self._is_ragged:
                 if not isinstance(self.Sigy,list) or (len(self.Sigy)!=len(self.y)):
                     raise ValueError('for ragged obs Sigy must also be a list of same len')
-                for ii in range(len(self.Sigy)):
-                    self.Sigy[ii]=np.atleast_2d(self.Sigy[ii])
-                    val_Sigy(self.Sigy[ii],self.y.shape[1])
+                self.Sigy = [np.atleast_2d(Sigy_el) for Sigy_el in self.Sigy]
+                Sigy_sizes = np.fromiter((Sigy_el.shape[0] for Sigy_el in self.Sigy), dtype=np.intp, count=len(self.Sigy))
+                if not np.array_equal(Sigy_sizes, np.diff(self.y_offsets)):
+                    raise ValueError('Sigy must be the same size as the number of observations')
+                self.Sigy_chol = [val_Sigy(Sigy_el) for Sigy_el in self.Sigy]
             else:
                 self.Sigy = np.atleast_2d(self.Sigy)
-                val_Sigy(self.Sigy, self.y.shape[1])
+                if self.Sigy.shape[0] != self.y.shape[1]:
+                    raise ValueError('Sigy must be the same size as the number of observations')
+                self.Sigy_chol = val_Sigy(self.Sigy)
 
         # Validation complete
 
         # Basis and transform stuff initialized to None
         self.K = None
+        self.K_orthonormal = False
         self.D = None
         self.orig_y_sd = None
         self.orig_y_mean = None
         self.y_std = None
+        self.y_std_flat = None
         self.Sigy_std = None
+        self.Sigy_std_chol = None
+        self.Sigy_std_logdet = None
         self.x_trans = None
         self.t_trans = None
         self.orig_t_min = None
         self.orig_t_max = None
         self.orig_x_min = None
         self.orig_x_max = None
+        self._DK_solve_cache = None # obs K/D weights cached by SepiaPlot, cleared by SepiaData when y_std or bases change
+        self._pca_cache = None # sim y_std decompositions cached by SepiaData.compute_sim_PCA_basis
+
+    def __getstate__(self):
+        # caches are rebuilt on demand, so leave them out of pickles (the PCA cache is as large as y_std)
+        state = self.__dict__.copy()
+        state['_DK_solve_cache'] = None
+        state['_pca_cache'] = None
+        return state
+
+    # These make sure x/y/t are 2D no matter what, C-contiguous, and in the requested dtype (no copy if already so)
+    def _as_2d(self, a):
+        if a.ndim == 1:
+            a = np.expand_dims(a, 1)
+        return np.ascontiguousarray(a, dtype=self.dtype)
 
-    # These make sure x/y/t are 2D no matter what
     @property
     def x(self):
         return self.__x
@@ -114,12 +165,9 @@ class DataContainer(object):
     @x.setter
     def x(self, x):
         if not isinstance(x, list):
-            if x.ndim == 1:
-                x = x[:, None]
+            x = self._as_2d(x)
         else:
-            for ii in range(len(x)):
-                if x[ii].ndim == 1:
-                    x[ii] = x[ii][:, None]
+            x = [self._as_2d(xel) for xel in x] # new list, caller's list is left unchanged
         self.__x = x
 
     @property
@@ -129,8 +177,7 @@ class DataContainer(object):
     @y.setter
     def y(self, y):
         if not isinstance(y, list):
-            if y.ndim == 1:
-                y = y[:, None]
+            y = self._as_2d(y)
         self.__y = y
 
     @property
@@ -140,6 +187,5 @@ class DataContainer(object):
     @t.setter
     def t(self, t):
         if t is not None:
-            if t.ndim == 1:
-                t = t[:, None]
-        self.__t = t
\ No newline at end of file
+            t = self._as_2d(t)
+        self.__t = t
@@ -2,8 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
+import scipy.linalg
+import scipy.sparse.linalg
 
 from sepia.DataContainer import DataContainer
+from sepia._kernels import interp_rows
+
+# Helpers for scaling obs Sigy by the sim SD, shared by the dense and ragged obs standardization
+def _cov_norm(ysd):
+    if np.isscalar(ysd):
+        return ysd**2
+    ysd=ysd.reshape((1,-1))
+    return(ysd.T @ ysd)
+
+# Cholesky factor of Sigy / (ysd ysd') is diag(1/ysd) @ chol(Sigy), so reuse the factor from validation
+def _chol_norm(chol, ysd):
+    if np.isscalar(ysd):
+        return chol / ysd
+    return chol / ysd.reshape((-1,1))
+
+def _chol_logdet(chol):
+    return 2 * np.sum(np.log(np.diag(chol)))
+
+# Sign convention for PCs from eigh/svds, whose signs are arbitrary: flip each column to make its largest magnitude entry positive
+def _sign_pcs(U):
+    signs = np.sign(U[np.argmax(np.abs(U), axis=0), np.arange(U.shape[1])])
+    signs[signs == 0] = 1
+    return U * signs
 
 class SepiaData(object):
     """
@@ -27,7 +52,7 @@ class SepiaData(object):
     """
 
     def __init__(self, x_sim=None, t_sim=None, y_sim=None, y_ind_sim=None, x_obs=None, y_obs=None, Sigy=None, y_ind_obs=None,
-                 x_cat_ind=None, t_cat_ind=None, xt_sim_sep=None):
+                 x_cat_ind=None, t_cat_ind=None, xt_sim_sep=None, dtype=None):
         """
         Create SepiaData object. Many arguments are optional depending on the type of model.
         Users should instantiate with all data needed for the desired model. See documentation pages for more detail.
@@ -44,6 +69,8 @@ class SepiaData(object):
         :param numpy.ndarray/list/NoneType t_cat_ind: indices of t that are categorical (0 = not cat, int > 0 = how many categories), or None
         :param numpy.ndarray/list/NoneType xt_sim_sep: for separable design, list of kronecker composable matrices; it is a list of 2 or
                                                        more design components that, through Kronecker expansion, produce the full input space (`x` and `t`) for the simulations.
+        :param numpy.dtype/NoneType dtype: optional floating point dtype (e.g. np.float32) for x, y, t of sim and obs data; standardized y,
+                                           K basis and transformed x/t inherit it. Default None keeps the input dtypes (normally float64).
         :raises: TypeError if shapes not conformal or required data missing.
 
         .. note: At least one of x_sim and t_sim must be provided, and y_sim must always be provided.
@@ -92,7 +119,7 @@ class SepiaData(object):
         # the separable design components will be used in logLik and predict, nobody else needs to worry about it now
         # (except carrying it along in SetupModel
 
-        self.sim_data = DataContainer(x=x_sim, y=y_sim, t=t_sim, y_ind=y_ind_sim, xt_sep_design=xt_sim_sep)
+        self.sim_data = DataContainer(x=x_sim, y=y_sim, t=t_sim, y_ind=y_ind_sim, xt_sep_design=xt_sim_sep, dtype=dtype)
 
         self.scalar_out = (self.sim_data.y.shape[1] == 1)
 
@@ -103,9 +130,9 @@ class SepiaData(object):
         else:
             if x_sim.shape[1] != x_obs.shape[1]:
                 raise TypeError('x_sim and x_obs do not contain the same number of variables/columns.')
-            self.obs_data = DataContainer(x=x_obs, y=y_obs, y_ind=y_ind_obs, Sigy=Sigy)
+            self.obs_data = DataContainer(x=x_obs, y=y_obs, y_ind=y_ind_obs, Sigy=Sigy, dtype=dtype)
             self.sim_only = False
-            self.ragged_obs = isinstance(y_obs, list)
+            self.ragged_obs = self.obs_data._is_ragged
 
         # Set up Sigy - now done in scaling code
 
@@ -213,6 +240,13 @@ class SepiaData(object):
 
         """
 
+        # (a - a_min) / (a_max - a_min), with a single (n, p) allocation for float a
+        def unit_trans(a, a_min, a_max):
+            res = a - a_min
+            if not np.issubdtype(res.dtype, np.floating):
+                res = res.astype(float)
+            return np.divide(res, a_max - a_min, out=res)
+
         x_trans, t_trans = None, None
         if x_notrans is None:
             x_notrans = []
@@ -248,17 +282,17 @@ class SepiaData(object):
                 x_notrans = list(set(x_notrans) | set([i for i in range(nx) if self.x_cat_ind[i] > 0]))
             orig_x_min[:, x_notrans] = 0
             orig_x_max[:, x_notrans] = 1
-            self.sim_data.x_trans = (self.sim_data.x - orig_x_min) / (orig_x_max - orig_x_min)
+            self.sim_data.x_trans = unit_trans(self.sim_data.x, orig_x_min, orig_x_max)
             self.sim_data.orig_x_min = orig_x_min
             self.sim_data.orig_x_max = orig_x_max
             if not self.sim_only:
                 self.obs_data.orig_x_min = orig_x_min
                 self.obs_data.orig_x_max = orig_x_max
-                self.obs_data.x_trans = (self.obs_data.x - orig_x_min) / (orig_x_max - orig_x_min)
+                self.obs_data.x_trans = unit_trans(self.obs_data.x, orig_x_min, orig_x_max)
 
         # If a new x was passed in, transform it
         if x is not None and not native:
-            x_trans = (x - self.sim_data.orig_x_min) / (self.sim_data.orig_x_max - self.sim_data.orig_x_min)
+            x_trans = unit_trans(x, self.sim_data.orig_x_min, self.sim_data.orig_x_max)
         if x is not None and native:
             x_trans = (x * (self.sim_data.orig_x_max - self.sim_data.orig_x_min)) + self.sim_data.orig_x_min
 
@@ -287,7 +321,7 @@ class SepiaData(object):
                     t_notrans = list(set(t_notrans) | set([i for i in range(nt) if self.t_cat_ind[i] > 0]))
                 orig_t_min[:, t_notrans] = 0
                 orig_t_max[:, t_notrans] = 1
-                self.sim_data.t_trans = (self.sim_data.t - orig_t_min) / (orig_t_max - orig_t_min)
+                self.sim_data.t_trans = unit_trans(self.sim_data.t, orig_t_min, orig_t_max)
                 self.sim_data.orig_t_min = orig_t_min
                 self.sim_data.orig_t_max = orig_t_max
                 if not self.sim_only:
@@ -295,7 +329,7 @@ class SepiaData(object):
                     self.obs_data.orig_t_max = orig_t_max
             # If a new t was passed in, transform it
             if t is not None and not native:
-                t_trans = (t - self.sim_data.orig_t_min) / (self.sim_data.orig_t_max - self.sim_data.orig_t_min)
+                t_trans = unit_trans(t, self.sim_data.orig_t_min, self.sim_data.orig_t_max)
             if t is not None and native:
                 t_trans = (t * (self.sim_data.orig_t_max - self.sim_data.orig_t_min)) + self.sim_data.orig_t_min
 
@@ -316,7 +350,7 @@ class SepiaData(object):
 
         return x_trans, t_trans
     
-    def standardize_y(self, center=True, scale='scalar', y_mean=None, y_sd=None):
+    def standardize_y(self, center=True, scale='scalar', y_mean=None, y_sd=None, inplace=False, dtype=None):
         """
         Standardizes both `sim_data` and `obs_data` outputs y based on sim_data.y mean/SD.
 
@@ -324,7 +358,23 @@ class SepiaData(object):
         :param string/bool scale: how to rescale: 'scalar': single SD over all demeaned data, 'columnwise': SD for each column of demeaned data, False: no rescaling
         :param numpy.ndarray/float/NoneType y_mean: y_mean for sim; optional, should match length of y_ind_sim or be scalar
         :param numpy.ndarray/float/NoneType y_sd: y_sd for sim; optional, should match length of y_ind_sim or be scalar
+        :param bool inplace: standardize sim_data.y in its own buffer instead of allocating a new array, so sim_data.y_std is sim_data.y
+        :param numpy.dtype/NoneType dtype: optional floating point dtype for sim and obs y_std (e.g. np.float32, which halves the
+                                           memory traffic of create_K_basis), or None to keep the dtype of y; mean/SD are computed
+                                           in the dtype of y
+        :raises ValueError: if inplace is used with non-floating point sim y, or with a dtype different from sim y
+
+        .. note:: With `inplace=True`, the original sim_data.y values (normally the y_sim array passed to SepiaData) are
+                  overwritten; they are recoverable from orig_y_mean/orig_y_sd, but standardize_y should not be called again.
+
         """
+        if inplace and not np.issubdtype(self.sim_data.y.dtype, np.floating):
+            raise ValueError('standardize_y: inplace requires floating point sim y')
+        if inplace and dtype is not None and np.dtype(dtype) != self.sim_data.y.dtype:
+            raise ValueError('standardize_y: inplace requires dtype to match sim y')
+        self.sim_data._pca_cache = None
+        if not self.sim_only:
+            self.obs_data._DK_solve_cache = None
         if center:
             if y_mean is None:
                 self.sim_data.orig_y_mean = np.mean(self.sim_data.y, 0)
@@ -332,67 +382,98 @@ class SepiaData(object):
                 self.sim_data.orig_y_mean = y_mean
         else:
             self.sim_data.orig_y_mean = 0.
-        y_dm = self.sim_data.y - self.sim_data.orig_y_mean
+        if inplace:
+            y_dm = np.subtract(self.sim_data.y, self.sim_data.orig_y_mean, out=self.sim_data.y)
+        else:
+            y_dm = self.sim_data.y - self.sim_data.orig_y_mean
         if y_sd is not None:
             self.sim_data.orig_y_sd = y_sd
         else:
+            # when y_dm was centered on the sim mean it has zero mean, so the SD is a single sum of squares pass over it
+            # (np.std would demean y_dm again, through a temporary the size of y); otherwise (center=False or a given
+            # y_mean) y_dm need not have zero mean and np.std is used
+            demeaned = center and y_mean is None
             if scale == 'scalar':
-                self.sim_data.orig_y_sd = np.std(y_dm, ddof=1)
+                if demeaned:
+                    self.sim_data.orig_y_sd = np.sqrt(np.vdot(y_dm, y_dm) / (y_dm.size - 1))
+                else:
+                    self.sim_data.orig_y_sd = np.std(y_dm, ddof=1)
             elif scale == 'columnwise':
-                self.sim_data.orig_y_sd = np.std(y_dm, ddof=1, axis=0)
+                if demeaned:
+                    self.sim_data.orig_y_sd = np.sqrt(np.einsum('ij,ij->j', y_dm, y_dm) / (y_dm.shape[0] - 1))
+                else:
+                    self.sim_data.orig_y_sd = np.std(y_dm, ddof=1, axis=0)
             elif scale is False:
                 self.sim_data.orig_y_sd = 1.
             else:
                 raise ValueError('standardize_y: invalid value for scale parameter, allowed are {''scalar'',''columnwise'',False}')
-        self.sim_data.y_std = y_dm/self.sim_data.orig_y_sd
+        # y_dm is a fresh buffer (or sim_data.y if inplace); scale it in place unless a different dtype was requested
+        if dtype is None or np.dtype(dtype) == y_dm.dtype:
+            self.sim_data.y_std = np.divide(y_dm, self.sim_data.orig_y_sd, out=y_dm)
+        else:
+            self.sim_data.y_std = np.divide(y_dm, self.sim_data.orig_y_sd, dtype=dtype)
         if not self.sim_only:
-            if not self.scalar_out and not np.isscalar(self.sim_data.orig_y_mean):
-                if self.ragged_obs:
-                    orig_y_mean = []
-                    for i in range(len(self.obs_data.y)):
-                        orig_y_mean.append(np.interp(self.obs_data.y_ind[i], self.sim_data.y_ind.squeeze(), self.sim_data.orig_y_mean))
-                else:
-                    orig_y_mean = np.interp(self.obs_data.y_ind.squeeze(), self.sim_data.y_ind.squeeze(), self.sim_data.orig_y_mean)
-                self.obs_data.orig_y_mean = orig_y_mean
-            else:
-                if self.ragged_obs:
-                    self.obs_data.orig_y_mean = [self.sim_data.orig_y_mean for i in range(len(self.obs_data.y))]
-                else:
-                    self.obs_data.orig_y_mean = self.sim_data.orig_y_mean
-            if not self.scalar_out and not np.isscalar(self.sim_data.orig_y_sd):
-                if self.ragged_obs:
-                    orig_y_sd = []
-                    for i in range(len(self.obs_data.y)):
-                        orig_y_sd.append(np.interp(self.obs_data.y_ind[i], self.sim_data.y_ind.squeeze(), self.sim_data.orig_y_sd))
-                else:
-                    orig_y_sd = np.interp(self.obs_data.y_ind, self.sim_data.y_ind, self.sim_data.orig_y_sd)
-                self.obs_data.orig_y_sd = orig_y_sd
-            else:
-                if self.ragged_obs:
-                    self.obs_data.orig_y_sd = [self.sim_data.orig_y_sd for i in range(len(self.obs_data.y))]
-                else:
-                    self.obs_data.orig_y_sd = self.sim_data.orig_y_sd
-            def cov_norm(ysd):
-                if np.isscalar(ysd):
-                    return ysd**2
-                ysd=ysd.reshape((1,-1))
-                return(ysd.T @ ysd)
             if self.ragged_obs:
-                ty_std=[]; tSigy_std=[]
-                for i in range(len(self.obs_data.y)):
-                    ty_std.append( (self.obs_data.y[i] - self.obs_data.orig_y_mean[i]) / self.obs_data.orig_y_sd[i] )
-                    if self.obs_data.Sigy is None:
-                        tSigy_std.append(np.atleast_2d(np.diag(np.ones(self.obs_data.y[i].shape))))
-                    else:
-                        tSigy_std.append(self.obs_data.Sigy[i] / cov_norm(self.obs_data.orig_y_sd[i]) )
+                self._standardize_obs_ragged(dtype)
             else:
-                ty_std = (self.obs_data.y - self.obs_data.orig_y_mean) / self.obs_data.orig_y_sd
-                if self.obs_data.Sigy is None:
-                    tSigy_std = np.diag(np.ones(self.obs_data.y.shape[1]))
-                else:
-                    tSigy_std = self.obs_data.Sigy / cov_norm(self.obs_data.orig_y_sd)
-            self.obs_data.y_std = ty_std
-            self.obs_data.Sigy_std=tSigy_std
+                self._standardize_obs_dense(dtype)
+
+    def _standardize_obs_dense(self, dtype=None):
+        # Standardizes obs_data for shared obs indices using the sim mean/SD (interpolated to obs indices if not scalar).
+        # Used internally by standardize_y.
+        # :param numpy.dtype/NoneType dtype: dtype for obs y_std, or None to keep the dtype of y
+        if not self.scalar_out and not np.isscalar(self.sim_data.orig_y_mean):
+            self.obs_data.orig_y_mean = interp_rows(self.obs_data.y_ind.squeeze(), self.sim_data.y_ind, self.sim_data.orig_y_mean)
+        else:
+            self.obs_data.orig_y_mean = self.sim_data.orig_y_mean
+        if not self.scalar_out and not np.isscalar(self.sim_data.orig_y_sd):
+            self.obs_data.orig_y_sd = interp_rows(self.obs_data.y_ind, self.sim_data.y_ind, self.sim_data.orig_y_sd)
+        else:
+            self.obs_data.orig_y_sd = self.sim_data.orig_y_sd
+        self.obs_data.y_std = np.divide(self.obs_data.y - self.obs_data.orig_y_mean, self.obs_data.orig_y_sd, dtype=dtype)
+        if self.obs_data.Sigy is None:
+            self.obs_data.Sigy_std = np.diag(np.ones(self.obs_data.y.shape[1]))
+            self.obs_data.Sigy_std_chol = self.obs_data.Sigy_std
+        else:
+            self.obs_data.Sigy_std = self.obs_data.Sigy / _cov_norm(self.obs_data.orig_y_sd)
+            self.obs_data.Sigy_std_chol = _chol_norm(self.obs_data.Sigy_chol, self.obs_data.orig_y_sd)
+        self.obs_data.Sigy_std_logdet = _chol_logdet(self.obs_data.Sigy_std_chol)
+
+    def _standardize_obs_ragged(self, dtype=None):
+        # Standardizes obs_data for ragged obs using the sim mean/SD, all obs at once in the flat layout of obs_data.y_flat.
+        # Mean and SD are interpolated in one call over obs_data.y_ind_flat and kept as flat arrays (or scalars); the per obs
+        # lists orig_y_mean, orig_y_sd and y_std hold views into them. Used internally by standardize_y.
+        # :param numpy.dtype/NoneType dtype: dtype for obs y_std, or None to keep the dtype of y
+        od = self.obs_data
+        y_offsets = od.y_offsets
+        if not self.scalar_out and not np.isscalar(self.sim_data.orig_y_mean):
+            obs_y_mean_flat = interp_rows(od.y_ind_flat, self.sim_data.y_ind, self.sim_data.orig_y_mean)
+            od.orig_y_mean = np.split(obs_y_mean_flat, y_offsets[1:-1])
+        else:
+            obs_y_mean_flat = self.sim_data.orig_y_mean
+            od.orig_y_mean = [self.sim_data.orig_y_mean for i in range(len(od.y))]
+        if not self.scalar_out and not np.isscalar(self.sim_data.orig_y_sd):
+            obs_y_sd_flat = interp_rows(od.y_ind_flat, self.sim_data.y_ind, self.sim_data.orig_y_sd)
+            od.orig_y_sd = np.split(obs_y_sd_flat, y_offsets[1:-1])
+        else:
+            obs_y_sd_flat = self.sim_data.orig_y_sd
+            od.orig_y_sd = [self.sim_data.orig_y_sd for i in range(len(od.y))]
+        ty_std_flat = (od.y_flat - obs_y_mean_flat) / obs_y_sd_flat
+        if dtype is not None:
+            ty_std_flat = ty_std_flat.astype(dtype, copy=False)
+        od.y_std_flat = ty_std_flat
+        od.y_std = np.split(ty_std_flat, y_offsets[1:-1])
+        tSigy_std=[]; tSigy_std_chol=[]
+        for i in range(len(od.y)):
+            if od.Sigy is None:
+                tSigy_std.append(np.atleast_2d(np.diag(np.ones(od.y[i].shape))))
+                tSigy_std_chol.append(tSigy_std[i])
+            else:
+                tSigy_std.append(od.Sigy[i] / _cov_norm(od.orig_y_sd[i]))
+                tSigy_std_chol.append(_chol_norm(od.Sigy_chol[i], od.orig_y_sd[i]))
+        od.Sigy_std = tSigy_std
+        od.Sigy_std_chol = tSigy_std_chol
+        od.Sigy_std_logdet = [_chol_logdet(chol) for chol in tSigy_std_chol]
 
     def set_mean_basis(self, basis_type='linear'):
         """
@@ -449,12 +530,20 @@ class SepiaData(object):
         return Haug
 
 
-    def create_K_basis(self, n_pc=0.995, K=None):
+    def create_K_basis(self, n_pc=0.995, K=None, full_svd=False, k_is_orthonormal=False, gram=False, truncated=False):
         """
         Creates `K_sim` and `K_obs` basis functions using PCA on sim_data.y_std, or using given `K_sim` matrix.
 
         :param float/int n_pc: proportion in [0, 1] of variance, or an integer number of components
         :param numpy.ndarray/None K: a basis matrix on sim indices of shape (n_basis_elements, ell_sim) or None
+        :param bool full_svd: always compute the PCA basis from a full SVD of sim_data.y_std (slower; for validation)
+        :param bool k_is_orthonormal: given K has orthonormal rows (checked once here), so sim weights on K are just y_std K'
+        :param bool gram: for tall sim_data.y_std (no fewer sims than outputs), compute the PCA basis from an eigendecomposition
+                          of the (ell, ell) Gram matrix instead of the SVD; faster, but it squares the condition number, so
+                          trailing PCs lose relative accuracy, and each PC is signed so its largest magnitude entry is positive
+        :param bool truncated: for wide sim_data.y_std (more outputs than sims), compute only the leading n_pc singular
+                               triplets (ARPACK) instead of the full SVD; needs an integer n_pc, and each PC is signed as for gram
+        :raises ValueError: if k_is_orthonormal is set and K K' is not the identity, or truncated is set without an integer n_pc
 
         .. note:: if standardize_y() method has not been called first, it will be called automatically by this method.
         """
@@ -472,41 +561,85 @@ class SepiaData(object):
                 raise TypeError('create_K_basis: K specified must be a numpy ndarray')
             if len(K.shape)!=2 or K.shape[1]!=self.sim_data.y.shape[1]:
                 raise ValueError('create_K_basis: must be 2D, and K and y_sim must have the same second dimension')
+            if k_is_orthonormal and not np.allclose(K @ K.T, np.eye(K.shape[0])):
+                raise ValueError('create_K_basis: k_is_orthonormal given but K does not have orthonormal rows')
             self.sim_data.K = K
+            self.sim_data.K_orthonormal = k_is_orthonormal
         else:
-            self.compute_sim_PCA_basis(n_pc)
-        # interpolate PC basis to observed, if present
+            self.compute_sim_PCA_basis(n_pc, full_svd=full_svd, gram=gram, truncated=truncated)
+            self.sim_data.K_orthonormal = False
+        # interpolate PC basis to observed, if present; all pu rows of K are interpolated together, and for ragged obs all
+        # obs indices at once (y_ind_flat), with the K for each obs a view of its columns
         if not self.sim_only:
-            pu = self.sim_data.K.shape[0]
+            self.obs_data._DK_solve_cache = None
             if self.ragged_obs:
-                K_obs = []
-                for ki in range(len(self.obs_data.y)):
-                    K_obs_tmp = np.zeros((pu, self.obs_data.y_ind[ki].shape[0]))
-                    for i in range(pu):
-                        K_obs_tmp[i, :] = np.interp(self.obs_data.y_ind[ki], self.sim_data.y_ind, self.sim_data.K[i, :])
-                    K_obs.append(K_obs_tmp)
+                K_flat = interp_rows(self.obs_data.y_ind_flat, self.sim_data.y_ind, self.sim_data.K)
+                K_obs = np.split(K_flat, self.obs_data.y_offsets[1:-1], axis=1)
             else:
-                K_obs = np.zeros((pu, self.obs_data.y_ind.shape[0]))
-                for i in range(pu):
-                    K_obs[i, :] = np.interp(self.obs_data.y_ind, self.sim_data.y_ind, self.sim_data.K[i, :])
+                K_obs = interp_rows(self.obs_data.y_ind, self.sim_data.y_ind, self.sim_data.K)
             self.obs_data.K = K_obs
 
-    def compute_sim_PCA_basis(self, n_pc):
+    def compute_sim_PCA_basis(self, n_pc, full_svd=False, gram=False, truncated=False):
         # Does PCA basis computation on sim_data.y_std attribute, sets K attribute to calculated basis.
         # Used internally by create_K_basis.
         # :param float/int n_pc: number of components or a proportion of variance explained, in [0, 1].
+        # :param bool full_svd: use the full SVD regardless of the shape of y_std.
+        # :param bool gram: use the Gram matrix eigendecomposition for tall y_std (opt in, see create_K_basis).
+        # :param bool truncated: use a truncated SVD of n_pc (an integer) triplets for wide y_std (opt in, see create_K_basis).
+        if truncated and n_pc < 1:
+            raise ValueError('compute_sim_PCA_basis: truncated requires an integer number of components n_pc')
         y_std = self.sim_data.y_std
         if y_std is None:
             print('WARNING: y not standardized, applying default standardization before PCA...')
             self.standardize_y()
-        U, s, V = np.linalg.svd(y_std.T, full_matrices=False)
-        s2 = np.square(s)
+            y_std = self.sim_data.y_std
+        m, ell = y_std.shape
+        # (ell, m) F-contiguous layout that LAPACK/BLAS read without a copy; for the C-contiguous y_std made by standardize_y this
+        # is just the view y_std.T, so only a y_std set by hand in another layout is copied (once, for all paths below)
+        y_std_T = np.asfortranarray(y_std.T)
+        # decompositions of this y_std are cached by method, so calls with another n_pc reuse them and give the same basis
+        # a fresh computation would; the cache is dropped when y_std is replaced (or restandardized)
+        cache = getattr(self.sim_data, '_pca_cache', None)
+        if cache is None or cache[0] is not y_std:
+            cache = (y_std, {})
+            self.sim_data._pca_cache = cache
+        decomps = cache[1]
+        U = None
+        if full_svd:
+            pass
+        elif gram and m >= ell:
+            if 'gram' not in decomps:
+                # Tall y_std: eigendecompose the (ell, ell) Gram matrix y_std.T @ y_std (formed by BLAS syrk) instead of the (m, ell) SVD.
+                # Its eigenvalues are the squared singular values and its eigenvectors the left singular vectors of y_std.T, up
+                # to sign; eigh's signs are arbitrary, so they are fixed by _sign_pcs.
+                syrk = scipy.linalg.blas.get_blas_funcs('syrk', (y_std_T,))
+                C = syrk(1.0, y_std_T) # upper triangle is filled
+                s2, U = scipy.linalg.eigh(C, lower=False, overwrite_a=True, check_finite=False)
+                s2 = np.maximum(s2[::-1], 0) # descending, clip roundoff below zero
+                decomps['gram'] = (_sign_pcs(U[:, ::-1]), np.sqrt(s2), s2, np.sum(s2))
+            U, s, s2, total_var = decomps['gram']
+        elif truncated and ell > m > int(n_pc):
+            # Wide y_std: compute only the n_pc leading singular triplets (ARPACK), which is much cheaper than the full SVD
+            # while they are few compared to m; signs are fixed by _sign_pcs.
+            k = int(n_pc)
+            if ('svds', k) not in decomps:
+                v0 = np.random.RandomState(0).uniform(-1, 1, m) # fixed start vector, so the basis is repeatable
+                Uk, sk, _ = scipy.sparse.linalg.svds(y_std_T, k=k, v0=v0)
+                order = np.argsort(sk)[::-1]
+                decomps[('svds', k)] = (_sign_pcs(Uk[:, order]), sk[order], np.square(sk[order]), None)
+            U, s, s2, total_var = decomps[('svds', k)]
+        if U is None:
+            if 'svd' not in decomps:
+                U, s, _ = np.linalg.svd(y_std_T, full_matrices=False)
+                s2 = np.square(s)
+                decomps['svd'] = (U, s, s2, np.sum(s2))
+            U, s, s2, total_var = decomps['svd']
         if n_pc < 1:
-            cum_var = s2 / np.sum(s2)
+            cum_var = s2 / total_var
             pu = np.sum(np.cumsum(cum_var) < n_pc) + 1
         else:
             pu = int(n_pc)
-        self.sim_data.K = np.transpose(np.dot(U[:, :pu], np.diag(s[:pu])) / np.sqrt(y_std.shape[0]))
+        self.sim_data.K = np.transpose(np.dot(U[:, :pu], np.diag(s[:pu])) / np.sqrt(m))
 
     def create_D_basis(self, D_type='constant', D_obs=None, D_sim=None, norm=True):
         """
@@ -527,6 +660,7 @@ class SepiaData(object):
         if self.scalar_out:
             print('Model has univariate output, skipping discrepancy...')
             return
+        self.obs_data._DK_solve_cache = None
         # Check if passed in D_sim/D_obs are correct shape and if so, set them into objects
         if D_sim is not None:
             if not D_sim.shape[1] == self.sim_data.y.shape[1]:
@@ -554,9 +688,12 @@ class SepiaData(object):
             else:
                 self.obs_data.D = np.vstack([np.ones(self.obs_data.y.shape[1]), self.obs_data.y_ind])
         # Normalize D to match priors
+        # The largest element of the Gram matrix D @ D.T is on its diagonal, so only the squared row norms are needed
+        def D_norm(D):
+            return np.sqrt(np.max(np.einsum('ij,ij->i', D, D)))
         if norm:
             if D_sim is not None:
-                norm_scl = np.sqrt(np.max(np.dot(self.sim_data.D, self.sim_data.D.T)))
+                norm_scl = D_norm(self.sim_data.D)
                 self.sim_data.D /= norm_scl
                 if self.ragged_obs:
                     for i in range(len(self.obs_data.D)):
@@ -565,9 +702,9 @@ class SepiaData(object):
                     self.obs_data.D /= norm_scl
             else:
                 if self.ragged_obs:
-                    norm_scl = np.sqrt(np.max(np.dot(self.obs_data.D[0], self.obs_data.D[0].T)))
+                    norm_scl = D_norm(self.obs_data.D[0])
                     for i in range(len(self.obs_data.D)):
                         self.obs_data.D[i] /= norm_scl
                 else:
-                    norm_scl = np.sqrt(np.max(np.dot(self.obs_data.D, self.obs_data.D.T)))
+                    norm_scl = D_norm(self.obs_data.D)
                     self.obs_data.D /= norm_scl
@@ -3,6 +3,28 @@ import scipy.linalg
 
 from sepia.SepiaDistCov import SepiaDistCov
 
+def gauss_log_lik(cov, w, verbose=False):
+    """
+    Gaussian log likelihood (up to constant) of w under zero mean and covariance cov.
+
+    :param numpy.ndarray cov: covariance matrix
+    :param numpy.ndarray w: data vector (or column)
+    :param bool verbose: print shape information
+    :return: tuple of log likelihood value and lower Cholesky factor of cov (None if factorization failed)
+    """
+    try:
+        chCov = scipy.linalg.cholesky(cov, lower=True, check_finite=False)
+    except np.linalg.LinAlgError:
+        print('chol error')
+        return -np.inf, None
+    logDet = np.sum(np.log(np.diag(chCov))) # log sqrt(det)
+    if verbose:
+        print('in gauss_log_lik chCov shape ', chCov.shape, ' w shape ', w.shape)
+    # w' inv(cov) w = |inv(chCov) w|^2, a single triangular solve
+    p1 = scipy.linalg.solve_triangular(chCov, w, lower=True, check_finite=False)
+    L = -logDet - 0.5 * np.sum(p1 * p1)
+    return L, chCov
+
 def compute_log_lik(g, cvar='all', cindex=None):
     """
     Compute log likelihood for model g. Returns value and also stores it in g.num.logLik.
@@ -17,20 +39,6 @@ def compute_log_lik(g, cvar='all', cindex=None):
     if g.verbose:
         print('Entering SepiaLogLik')
 
-    def doLogLik(cov, w):
-        try:
-            chCov = scipy.linalg.cholesky(cov, lower=True)
-        except np.linalg.LinAlgError:
-            print('chol error')
-            return -np.inf
-        logDet = np.sum(np.log(np.diag(chCov))) # log sqrt(det)
-        if g.verbose:
-            print('in doLogLik chCov shape ', chCov.shape, ' w shape ', w.shape)
-        # cho_solve cuts time almost in half compared to lstsq method
-        p1 = scipy.linalg.cho_solve((chCov, True), w)
-        L = -logDet - 0.5 * np.sum(p1 * w)
-        return L
-
     # calculate the equivalent quadratic form of kron separable data
     def sepQuadFormCalc(V,zp):
         # calculate right side of the kronecker quadratic form solve
@@ -147,12 +155,15 @@ def compute_log_lik(g, cvar='all', cindex=None):
                 cg = ztDistCov(betaU_val[:, jj], lamUz_val[0, jj])
                 np.fill_diagonal(cg, cg.diagonal() + 1/(LamSim[jj] * lamWOs_val) + 1/lamWs_val[0, jj])
                 # calculate the SigW likelihood for each block
-                num.SigWl[jj] = doLogLik(cg, w[jj*m:(jj+1)*m, 0])
+                num.SigWl[jj], chCg = gauss_log_lik(cg, w[jj*m:(jj+1)*m, 0], g.verbose)
                 # calculate the SigW inverse for each block
                 if n > 0:  # only needed for a calibration model
                     if g.verbose:
                         print('In computeLogLik: shape of cg ', cg.shape)
-                    num.SigWi[jj] = np.linalg.inv(cg)
+                    if chCg is None:
+                        num.SigWi[jj] = np.linalg.inv(cg)
+                    else: # reuse the factor from the likelihood
+                        num.SigWi[jj] = scipy.linalg.cho_solve((chCg, True), np.eye(m), check_finite=False)
             else: # kronecker dataset, compute as kron'd blocks
                 segVarStart=0
                 cg=[]
@@ -267,7 +278,7 @@ def compute_log_lik(g, cvar='all', cindex=None):
             #    the u component of pre-concatenated vu?
 
         # Now we can get the LL of VU|W
-        LogLikVUgW = doLogLik(SigVUgW, MuDiff)
+        LogLikVUgW, _ = gauss_log_lik(SigVUgW, MuDiff, g.verbose)
 
     else: #test on whether we have observations - not sim_only
         LogLikVUgW=0
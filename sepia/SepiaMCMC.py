@@ -9,7 +9,7 @@ class SepiaMCMC:
     :var string stepType: MCMC step type in ['PropMH', 'Uniform', 'BetaRho', 'Recorder']
     :var numpy.ndarray/NoneType stepParam: step size params with shape param.val_shape, or None if using 'Recorder'
     :var sepia.SepiaParam parent: instantiated sepia.SepiaParam parameter object that this MCMC object corresponds to
-    :var list draws: list of MCMC draws (typically list of arrays, each of shape param.val_shape)
+    :var list draws: list of MCMC draws (typically list of arrays, each of shape param.val_shape; recorded draws are views into preallocated storage)
     :var float aCorr: for MH correction
     """
 
@@ -89,12 +89,49 @@ class SepiaMCMC:
         # If accept, new value is already part of val so leave it alone
         pass
 
+    def reserve(self, nsamp):
+        """
+        Preallocate storage for the next nsamp recorded draws, so recording does not allocate per draw.
+
+        :param int nsamp: number of draws to preallocate for
+        """
+        x = np.asarray(self.parent.val)
+        self._buffer = np.empty((nsamp,) + x.shape, dtype=x.dtype)
+        self._nbuffer = 0
+
+    def clear_draws(self):
+        """
+        Remove all recorded draws and release preallocated storage.
+
+        """
+        self.draws = []
+        self._buffer = None
+        self._nbuffer = 0
+
     def record(self, x=None):
         """
         Record value into MCMC draws.
 
         :param numpy.ndarray/NoneType x: optionally, a value to record; otherwise, current parent.val is used.
+
+        .. note:: Current values are copied into preallocated contiguous storage (see `reserve`), and draws holds views into it;
+                  storage grows in chunks if not reserved.
         """
-        if x is None:
-            x = self.parent.val.copy()
-        self.draws.append(x)
+        if x is not None:
+            self.draws.append(x)
+            return
+        x = np.asarray(self.parent.val)
+        buffer = getattr(self, '_buffer', None)
+        if buffer is None or self._nbuffer == buffer.shape[0] or buffer.shape[1:] != x.shape:
+            self.reserve(max(64, len(self.draws)))
+            buffer = self._buffer
+        buffer[self._nbuffer] = x
+        self.draws.append(buffer[self._nbuffer])
+        self._nbuffer += 1
+
+    def __getstate__(self):
+        # draws are pickled by value, so leave out the preallocated storage (which would duplicate them)
+        state = self.__dict__.copy()
+        state['_buffer'] = None
+        state['_nbuffer'] = 0
+        return state
@@ -6,7 +6,6 @@ from sepia.SepiaDistCov import SepiaDistCov
 from sepia.SepiaLogLik import compute_log_lik
 import statsmodels.api as sm
 from tqdm import tqdm
-import matplotlib.pyplot as plt
 from scipy import stats
 import scipy.linalg
 import os
@@ -161,11 +160,19 @@ class SepiaModel:
 
         # Transform obs data using D, Kobs -> v, u
         if not data.sim_only:
-            # Data observation error precision Lamy will be used for setup
+            # Data observation error precision Lamy will be used for setup, from the Sigy_std factor if available
+            def chol_inv(chol):
+                return scipy.linalg.cho_solve((chol, True), np.eye(chol.shape[0]), check_finite=False)
             if data.ragged_obs:
-                Lamy = [np.linalg.inv(obs_data.Sigy_std[i]) for i in range(len(obs_data.Sigy_std))]
+                if obs_data.Sigy_std_chol is None:
+                    Lamy = [np.linalg.inv(obs_data.Sigy_std[i]) for i in range(len(obs_data.Sigy_std))]
+                else:
+                    Lamy = [chol_inv(obs_data.Sigy_std_chol[i]) for i in range(len(obs_data.Sigy_std_chol))]
             else:
-                Lamy = np.linalg.inv(obs_data.Sigy_std)
+                if obs_data.Sigy_std_chol is None:
+                    Lamy = np.linalg.inv(obs_data.Sigy_std)
+                else:
+                    Lamy = chol_inv(obs_data.Sigy_std_chol)
 
             if data.scalar_out:
                 u = obs_data.y_std
@@ -368,7 +375,7 @@ class SepiaModel:
         if os.path.exists(file_name) and overwrite is False:
             raise FileExistsError('File %s already exists; specify unique name or use overwrite=True to overwrite.' % file_name)
         with open('%s.pkl' % file_name, 'wb') as f:
-            pickle.dump(save_dict, f)
+            pickle.dump(save_dict, f, protocol=pickle.HIGHEST_PROTOCOL)
         print('Model saved to %s.pkl' % file_name)
 
     def restore_model_info(self, file_name=None):
@@ -443,6 +450,43 @@ class SepiaModel:
         lp = sum([prm.prior.compute_log_prior() for prm in self.params.mcmcList])
         return ll + lp
 
+    def log_post_batch(self, theta):
+        """
+        Compute model log posterior for a batch of theta values, with all other variables held at their current values.
+        The model is restored to its previous state afterwards.
+
+        :param numpy.ndarray theta: theta values on the model (transformed) scale, shape (nbatch, q)
+        :return: numpy.ndarray -- log posterior values, shape (nbatch,); -inf where theta is out of bounds or violates theta constraint
+        :raises TypeError: if model is emulator-only (no theta)
+        :raises ValueError: if theta does not have q columns
+
+        .. note:: Follows the vectorized log probability convention of ensemble samplers, for instance
+                  `emcee.EnsembleSampler(nwalkers, q, model.log_post_batch, vectorize=True)`.
+
+        """
+        if self.num.sim_only:
+            raise TypeError('log_post_batch: emulator-only model has no theta.')
+        prm = self.params.theta
+        theta = np.atleast_2d(theta)
+        if theta.shape[1] != int(np.prod(prm.val_shape)):
+            raise ValueError('log_post_batch: theta must have shape (nbatch, %d)' % int(np.prod(prm.val_shape)))
+        if not hasattr(self.num, 'logLik'):
+            self.logLik() # initialize everything not depending on theta
+        # Only theta-dependent pieces are recomputed for each row, as in an mcmc step on theta
+        refVal = prm.val
+        refNum = self.num.ref_copy('theta')
+        lp_rest = sum([p.prior.compute_log_prior() for p in self.params.mcmcList if p is not prm])
+        lp = np.full(theta.shape[0], -np.inf)
+        try:
+            for i in range(theta.shape[0]):
+                prm.val = theta[i].reshape(prm.val_shape)
+                if prm.prior.is_in_bounds() and prm.prior.obeys_constraint():
+                    lp[i] = self.logLik(cvar='theta') + prm.prior.compute_log_prior() + lp_rest
+        finally:
+            prm.val = refVal
+            self.num.restore_ref(refNum)
+        return lp
+
     def print_prior_info(self, pnames=None):
         """
         Print some information about the priors.
@@ -525,6 +569,8 @@ class SepiaModel:
             do_propMH = False
         if not no_init:
             self.params.lp.set_val(self.logPost()) # Need to call once with cvar='all' (default) to initialize
+        for prm in self.params.mcmcList + [self.params.lp]:
+            prm.mcmc.reserve(nsamp)
         for _ in tqdm(range(nsamp), desc='MCMC sampling', mininterval=0.5, disable=not(prog)):
             self.mcmc_step(do_propMH)
 
@@ -534,8 +580,8 @@ class SepiaModel:
         :return: no returned value
         """
         for p in self.params.mcmcList:
-            p.mcmc.draws=[]
-        self.params.lp.mcmc.draws=[]
+            p.mcmc.clear_draws()
+        self.params.lp.mcmc.clear_draws()
 
     def get_num_samples(self):
         """
@@ -916,6 +962,8 @@ class SepiaModel:
             return_dict['ess']=ess
         # plot
         if plot:
+            from sepia.SepiaPlot import _plot_modules
+            _, plt = _plot_modules()
             fig, ax = plt.subplots()
             lags = np.linspace(0,nlags,nlags+1,dtype=int,endpoint=True)
             for i in range(len(autocorrs)):
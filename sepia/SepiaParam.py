@@ -97,11 +97,8 @@ class SepiaParam:
         if untransform_theta:
             draws = self.untransform_theta(draws)
         if flat:
-            # pythonic way to do this in-place? 
-            draws_flat = np.zeros((draws.shape[0], draws.shape[1]*draws.shape[2]))
-            for samp in range(draws.shape[0]):
-                draws_flat[samp, :] = np.ndarray.flatten(draws[samp, :, :], order='F')
-            draws = draws_flat
+            # flatten each sample in column-major order: (nsamp, a, b) -> (nsamp, a*b)
+            draws = np.asarray(draws.transpose(0, 2, 1).reshape((draws.shape[0], -1)), dtype=float)
         return draws
 
     def calc_accept_rate(self):
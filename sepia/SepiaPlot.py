@@ -1,14 +1,82 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import seaborn as sns
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpec
 import numpy as np
 import scipy as sp
 
-sns.set(style="ticks")
+# seaborn, matplotlib and pandas are imported by the plot functions on first use, so importing sepia for model fitting
+# does not load them (or select a matplotlib backend); the seaborn style is applied once, at the first plot
+_sns_initialized = False
+
+def _plot_modules():
+    # Returns (seaborn, matplotlib.pyplot), setting the seaborn style on the first call.
+    global _sns_initialized
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    if not _sns_initialized:
+        sns.set(style="ticks")
+        _sns_initialized = True
+    return sns, plt
+
+def _DK_solve(DK, y_std, Lamy=None):
+    # Ridge regularized weights of y_std on the rows of DK (basis, shape (pu+pv, ell_obs)): (DK Lamy DK' + 1e-6 I)^-1 DK Lamy y_std'.
+    # The system is symmetric positive definite, so it is solved with a Cholesky factorization instead of an inverse.
+    # Lamy=None stands for the identity, which is not formed or multiplied.
+    if Lamy is None:
+        DKprod = DK @ DK.T  # (pu+pv, pu+pv)
+        rhs = DK @ y_std.T
+    else:
+        DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])
+        rhs = np.linalg.multi_dot([DK, Lamy, y_std.T])
+    DKprod[np.diag_indices_from(DKprod)] += 1e-6
+    return sp.linalg.cho_solve(sp.linalg.cho_factor(DKprod, lower=True), rhs)
+
+def _sim_weights(data):
+    # Least squares weights of the standardized sims on the rows of sim K, (K K')^-1 K y_std', shape (m, pu).
+    # Equal to pinv(K)' y_std' for full rank K, but only needs a (pu, pu) Cholesky solve; falls back to pinv otherwise.
+    # For a K declared orthonormal in create_K_basis, K K' = I and the weights are just y_std K'.
+    K = data.sim_data.K
+    if getattr(data.sim_data, 'K_orthonormal', False):
+        return data.sim_data.y_std @ K.T
+    try:
+        return sp.linalg.cho_solve(sp.linalg.cho_factor(K @ K.T, lower=True), K @ data.sim_data.y_std.T).T
+    except np.linalg.LinAlgError:
+        return np.dot(np.linalg.pinv(K).T, data.sim_data.y_std.T).T
+
+def _obs_weights(data):
+    # Weights (u, v) of the standardized obs on the obs K and D bases (v is None without D), shapes (n, pu) and (n, pv).
+    # Shared by the K weight/residual plots, and cached on data.obs_data, keyed on the K, D and y_std objects themselves (the
+    # cache holds references and compares them with `is`, so a replaced array cannot match through a recycled id); SepiaData
+    # also clears the cache when it standardizes y or creates bases.
+    od = data.obs_data
+    key = (od.K, od.D, od.y_std)
+    cache = getattr(od, '_DK_solve_cache', None)
+    if cache is not None and all(a is b for a, b in zip(cache[0], key)):
+        return cache[1], cache[2]
+    if data.ragged_obs:
+        pu = np.array([k.shape[0] for k in od.K])
+        if not np.all(pu == pu[0]): raise ValueError('first dimension in lists not equal')
+        if od.D is None:
+            u = np.array([_DK_solve(od.K[i], od.y_std[i]).T for i in range(len(od.K))])
+            v = None
+        else:
+            pv = np.array([d.shape[0] for d in od.D])
+            if np.all(pv == pv[0]): pv = pv[0]
+            else: raise ValueError('first dimension in lists not equal')
+            vu = [_DK_solve(np.concatenate([od.D[i], od.K[i]]), od.y_std[i]) for i in range(len(od.D))]
+            v = np.array([vui[:pv].T for vui in vu])
+            u = np.array([vui[pv:].T for vui in vu])
+    else:
+        if od.D is None:
+            u = _DK_solve(od.K, od.y_std).T
+            v = None
+        else:
+            pv = od.D.shape[0]
+            vu = _DK_solve(np.concatenate([od.D, od.K]), od.y_std)  # DK is (pu+pv, ell_obs)
+            v = vu[:pv, :].T
+            u = vu[pv:, :].T
+    od._DK_solve_cache = (key, u, v)
+    return u, v
 
 def theta_pairs(samples_dict,design_names=None,native=False,lims=None,theta_ref=None,save=None):
     """
@@ -22,6 +90,8 @@ def theta_pairs(samples_dict,design_names=None,native=False,lims=None,theta_ref=
     :param str save: file name to save plot
     :returns: matplotlib figure
     """
+    import pandas as pd
+    sns, plt = _plot_modules()
     if 'theta' not in samples_dict.keys():
         print('No thetas to plot')
         return
@@ -97,6 +167,7 @@ def mcmc_trace(samples_dict,theta_names=None,start=0,end=None,n_to_plot=500,by_g
     :param str save: file name to save plot
     :returns: matplotlib figure
     """
+    _, plt = _plot_modules()
     # trim samples dict
     n_samples = samples_dict['lamUz'].shape[0]
     if n_to_plot>n_samples:
@@ -131,12 +202,12 @@ def mcmc_trace(samples_dict,theta_names=None,start=0,end=None,n_to_plot=500,by_g
             n_theta = min(samples_dict[k].shape[1],max_print)
             if n_theta > 1:
                 for j in range(n_theta):
-                    sns.lineplot(x=plot_idx,y=samples_dict[k][plot_idx,j], palette="tab10", linewidth=.75, ax = axs[axs_idx])
+                    axs[axs_idx].plot(plot_idx, samples_dict[k][plot_idx,j], linewidth=.75)
                     if k=='theta' and theta_names is not None: axs[axs_idx].set_ylabel(theta_names[j])
                     else: axs[axs_idx].set_ylabel(k+'_'+str(j+1))
                     axs_idx+=1
             else:
-                sns.lineplot(x=plot_idx,y=samples_dict[k][plot_idx,0], palette="tab10", linewidth=.75, ax = axs[axs_idx])
+                axs[axs_idx].plot(plot_idx, samples_dict[k][plot_idx,0], linewidth=.75)
                 if k=='theta' and theta_names is not None: axs.set_ylabel(theta_names[0])
                 else: axs[axs_idx].set_ylabel(k)
                 axs_idx+=1
@@ -153,12 +224,12 @@ def mcmc_trace(samples_dict,theta_names=None,start=0,end=None,n_to_plot=500,by_g
             n_lines = min(samples_dict[k].shape[1],max_print)
             if n_lines > 1:
                 for j in range(n_lines):
-                    sns.lineplot(x=plot_idx,y=samples_dict[k][plot_idx,j], palette="tab10", linewidth=.75, ax = axs[i],
+                    axs[i].plot(plot_idx, samples_dict[k][plot_idx,j], linewidth=.75,
                                 label= theta_names[j] if (i==0 and theta_names is not None) else k+str(j+1))
                 axs[i].set_ylabel(k)
                 lgds.append(axs[i].legend(bbox_to_anchor=(1.025, 1), loc='upper left', borderaxespad=0., ncol=int(np.ceil(n_lines/5))))
             else:
-                sns.lineplot(x=plot_idx,y=samples_dict[k][plot_idx,0], palette="tab10", linewidth=.75, ax = axs[i])
+                axs[i].plot(plot_idx, samples_dict[k][plot_idx,0], linewidth=.75)
                 axs[i].set_ylabel(theta_names[0] if (i==0 and theta_names is not None) else k)
         if save is not None: plt.savefig(save,dpi=300,bbox_extra_artists=lgds, bbox_inches='tight')
         return fig
@@ -174,6 +245,7 @@ def param_stats(samples_dict,theta_names=None,q1=0.05,q2=0.95,digits=4):
     :param int digits: how many digits to show in output
     :return: pandas DataFrame containing statistics
     """
+    import pandas as pd
     # theta_names : list
     # samples_dict : dictionary of samples
     # stats : dataframe with mean and std of all parameters
@@ -210,6 +282,7 @@ def rho_box_plots(model,labels=None):
     :param list/NoneType labels: optional labels to use for box plot
     :return: matplotlib figure
     """
+    _, plt = _plot_modules()
     samples_dict = {p.name: p.mcmc_to_array() for p in model.params.mcmcList}
     p = model.num.p
     q = model.num.q
@@ -266,6 +339,7 @@ def plot_K_basis(data, max_plots=4, obs=True):
         :param int max_plots: maximum number of principal components to plot
         :return: tuple containing matplotlib figure objects: (fig_sim, fig_obs) or just fig_sim if no observed data is present
         """
+        _, plt = _plot_modules()
         # Return early if scalar out or basis not set up
         if data.scalar_out:
             print('Scalar output, no K basis to plot.')
@@ -331,6 +405,7 @@ def plot_K_weights(data, max_u_plot=5):
         :param int max_u_plot: max number of u's for which to plot vertical line over histogram of w's
         :return: tuple containing matplotlib figure objects: (fig_uw, fig_v) or just fig_uw if no discrepancy is specified
         """
+        _, plt = _plot_modules()
         # Return early if scalar out or basis not set up
         if data.scalar_out:
             print('Scalar output, no K weights to plot.')
@@ -342,7 +417,7 @@ def plot_K_weights(data, max_u_plot=5):
         pu = data.sim_data.K.shape[0]
         ncol = 5
         nrow = int(np.ceil(pu / ncol))
-        w = np.dot(np.linalg.pinv(data.sim_data.K).T, data.sim_data.y_std.T).T
+        w = _sim_weights(data)
 
         fig_uw, axs_uw = plt.subplots(nrow,ncol,figsize=(10,2*nrow))
         fig_uw.tight_layout()
@@ -360,21 +435,7 @@ def plot_K_weights(data, max_u_plot=5):
             # No D
             if data.obs_data.D is None:
                 pv = 0
-                DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                # compute u
-                if data.ragged_obs:
-                    u = []
-                    for i in range(len(data.obs_data.y_ind)):
-                        DK = data.obs_data.K[i]
-                        Lamy = np.eye(data.obs_data.y_ind[i].shape[0])
-                        DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])
-                        u.append(np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std[i].T])).T)
-                    u = np.array(u)
-                else:
-                    DK = data.obs_data.K
-                    Lamy = np.eye(data.obs_data.y_ind.shape[0]) # Identity with size len(y_ind) how to do this with ragged?
-                    DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                    u = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std.T])).T
+                u, _ = _obs_weights(data)
                             
                 nrow = int(np.ceil(pu / ncol))
                 if u.shape[1] == w.shape[1]:
@@ -398,31 +459,8 @@ def plot_K_weights(data, max_u_plot=5):
                     raise ValueError('u.shape[1] != w.shape[1]')
                                 
             else: # D
-                if data.ragged_obs:
-                    pv = np.array([d.shape[0] for d in data.obs_data.D])
-                    if np.all(pv == pv[0]): pv = pv[0]
-                    else: raise ValueError('first dimension in lists not equal')
-                    DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                    u = []
-                    v = []
-                    for i in range(len(data.obs_data.D)):
-                        DK = np.concatenate([data.obs_data.D[i], data.obs_data.K[i]])
-                        Lamy = np.eye(data.obs_data.y_ind[i].shape[0])
-                        DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                        vu = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std[i].T]))
-                        v.append(vu[:pv].T)
-                        u.append(vu[pv:].T)
-                    u = np.array(u)
-                    v = np.array(v)
-                else:
-                    pv = data.obs_data.D.shape[0]
-                    DK = np.concatenate([data.obs_data.D, data.obs_data.K])  # (pu+pv, ell_obs)
-                    DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                    Lamy = np.eye(data.obs_data.y_ind.shape[0])
-                    DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                    vu = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std.T]))
-                    v = vu[:pv, :].T
-                    u = vu[pv:, :].T
+                u, v = _obs_weights(data)
+                pv = v.shape[1]
                             
                 if u.shape[1] == w.shape[1]:
                     for i,ax in enumerate(axs_uw.flatten()):
@@ -461,6 +499,8 @@ def plot_u_w_pairs(data, max_plots=5, save=False):
         :param int max_plots: max number of principal components to plot
         :return: matplotlib figure fig_g: seaborn pairs figure
         """
+        import pandas as pd
+        sns, plt = _plot_modules()
         # Return early if scalar out or basis not set up
         if data.scalar_out:
             print('Scalar output, no K weights to plot.')
@@ -469,7 +509,7 @@ def plot_u_w_pairs(data, max_plots=5, save=False):
             print('K basis not set up, call create_K_basis() first.')
             return
         pu = data.sim_data.K.shape[0]
-        w = np.dot(np.linalg.pinv(data.sim_data.K).T, data.sim_data.y_std.T).T
+        w = _sim_weights(data)
                 
         if not data.sim_only and data.obs_data.K is not None:
             if data.ragged_obs:
@@ -482,47 +522,11 @@ def plot_u_w_pairs(data, max_plots=5, save=False):
             # No D
             if data.obs_data.D is None:
                 pv = 0
-                DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                if data.ragged_obs:
-                    u = []
-                    for i in range(len(data.obs_data.K)):
-                        DK = data.obs_data.K[i]
-                        Lamy = np.eye(data.obs_data.y_ind[i].shape[0])
-                        DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                        u.append(np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std[i].T])).T)
-                    u = np.array(u)
-                else:
-                    DK = data.obs_data.K
-                    Lamy = np.eye(data.obs_data.y_ind.shape[0])
-                    DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                    u = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std.T])).T
+                u, _ = _obs_weights(data)
                             
             else: # D
-                if data.ragged_obs:
-                    pv = np.array([d.shape[0] for d in data.obs_data.D])
-                    if np.all(pv == pv[0]): pv = pv[0]
-                    else: raise ValueError('first dimension in lists not equal')
-                    DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                    u = []
-                    v = []
-                    for i in range(len(data.obs_data.D)):
-                        DK = np.concatenate([data.obs_data.D[i], data.obs_data.K[i]])
-                        Lamy = np.eye(data.obs_data.y_ind[i].shape[0])
-                        DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                        vu = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std[i].T]))
-                        v.append(vu[:pv].T)
-                        u.append(vu[pv:].T)
-                    u = np.array(u)
-                    v = np.array(v)
-                else:
-                    pv = data.obs_data.D.shape[0]
-                    DK = np.concatenate([data.obs_data.D, data.obs_data.K])  # (pu+pv, ell_obs)
-                    DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                    Lamy = np.eye(data.obs_data.y_ind.shape[0])
-                    DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                    vu = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std.T]))
-                    v = vu[:pv, :].T
-                    u = vu[pv:, :].T
+                u, v = _obs_weights(data)
+                pv = v.shape[1]
 
             # change u,w to match max_plots
             if w.shape[1]>max_plots: 
@@ -558,6 +562,7 @@ def plot_K_residuals(data):
         :param SepiaData data: SepiaData object
         :return: tuple containing matplotlib figure objects: (fig_u, fig_v) or just fig_noD if no discrepancy is specified
         """
+        _, plt = _plot_modules()
         # Return early if scalar out or basis not set up
         if data.scalar_out:
             print('Scalar output, no K residuals to plot.')
@@ -566,18 +571,14 @@ def plot_K_residuals(data):
             print('K basis not set up, call create_K_basis() first.')
             return
         if not data.sim_only and data.obs_data.K is not None:
-            if isinstance(data.obs_data.K, list):
+            if data.ragged_obs:
                 print('plot_K_residuals cannot yet handle ragged observations')
                 return
             pu = data.obs_data.K.shape[0]
             if data.obs_data.D is None:
                 pv = 0
-                DK = data.obs_data.K
-                DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                Lamy = np.eye(data.obs_data.y_ind.shape[0])
-                DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                u = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std.T])).T
-                proj = np.dot(u, DK)
+                u, _ = _obs_weights(data)
+                proj = np.dot(u, data.obs_data.K)
                 resid = data.obs_data.y_std - proj
                 
                 fig_noD, axs_noD = plt.subplots(1,3,figsize=(4,6))
@@ -596,13 +597,7 @@ def plot_K_residuals(data):
                 return fig_noD
             else:
                 pv = data.obs_data.D.shape[0]
-                DK = np.concatenate([data.obs_data.D, data.obs_data.K])  # (pu+pv, ell_obs)
-                DKridge = 1e-6 * np.diag(np.ones(pu + pv))  # (pu+pv, pu+pv)
-                Lamy = np.eye(data.obs_data.y_ind.shape[0])
-                DKprod = np.linalg.multi_dot([DK, Lamy, DK.T])  # (pu+pv, pu+pv)
-                vu = np.dot(np.linalg.inv(DKprod + DKridge), np.linalg.multi_dot([DK, Lamy, data.obs_data.y_std.T]))
-                v = vu[:pv, :].T
-                u = vu[pv:, :].T
+                u, v = _obs_weights(data)
                 ncol = 5
                 nrow = int(np.ceil(pu / ncol))
                 fig_u,axs_u = plt.subplots(nrow,ncol,figsize=(8, 2 * nrow))
@@ -638,6 +633,8 @@ def plot_data(data,which_x=None,x_min=None,x_max=None,y_min=None,y_max=None,n_ne
         :param int max_sims: sets maximum number of simulation runs to plot
         :return matplotlib figure fig: figure object of plot
         """
+        _, plt = _plot_modules()
+        from matplotlib.gridspec import GridSpec
         if data.sim_only:
             print('plot_data does not currently work for sim_only models.')
             return
@@ -743,6 +740,7 @@ def pca_projected_data(data):
 
     :param SepiaData data: SepiaData object
     """
+    _, plt = _plot_modules()
     # 2 dimensional y_ind will require much more consideration to make a generalized plotting routine
     if data.ragged_obs and min(np.atleast_2d(data.obs_data.y_ind[0]).shape)>1:
         pass
@@ -828,6 +826,7 @@ def cv_predicted_vs_true(model,cvpred,figsize=(10,10)):
     :param SepiaModel model: SepiaModel object
     :param SepiaXvalEmulatorPrediction cvpred: SepiaXvalEmulatorPrediction object
     """
+    _, plt = _plot_modules()
     num_pc = model.data.sim_data.K.shape[0]
     wpred=cvpred.get_w()
     w=model.num.w.reshape((-1,num_pc),order='F')
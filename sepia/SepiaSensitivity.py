@@ -1,9 +1,13 @@
 
 import numpy as np
 import itertools
-import scipy.stats
+import scipy.linalg
+import scipy.special
 
 from sepia.SepiaDistCov import SepiaDistCov
+from sepia._kernels import HAVE_NUMBA
+if HAVE_NUMBA:
+    from sepia._kernels import _varf_trace_kernel
 
 def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, rg=None, option='mean'):
     """
@@ -95,14 +99,18 @@ def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, r
     # component Sens -- the bulk of the calculations are in component_sens()
     sim_xt = model.data.zt
     w = model.num.w.reshape((m, pu), order='F')
-    sa = []
+    # results for all basis components are held in arrays with a leading pu axis (sa_arrays); each sa[ii] dict is made
+    # of views into them, and component_sens fills those in place
+    sa_arrays = _sa_alloc((pu, npvec), nv, ngrid, varlist, jelist)
+    sa = [{key: val[ii] for key, val in sa_arrays.items()} for ii in range(pu)]
     cat_ind = np.concatenate([model.data.x_cat_ind, model.data.t_cat_ind])
     for ii in range(pu):
         bind = [ind + ii*nv for ind in ii0]
         betaU_sub = betaU[:, bind]
         lamUz_sub = lamUz[:, ii]
         lamWs_sub = lamWs[:, ii]
-        sa.append(component_sens(sim_xt[:, ii0], w[:, ii], betaU_sub, lamUz_sub, lamWs_sub, xe, ngrid, varlist, jelist, rg, cat_ind))
+        component_sens(sim_xt[:, ii0], w[:, ii], betaU_sub, lamUz_sub, lamWs_sub, xe, ngrid, varlist, jelist, rg, cat_ind,
+                       out=sa[ii])
 
     # Extract y info from model
     ymean = model.data.sim_data.orig_y_mean
@@ -116,39 +124,24 @@ def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, r
         ksmm = np.array([[1]])
 
     # Calculate smePm, stePm
+    # the per-sample indices are lam/vt weighted sums over basis components, i.e. over the leading axis of sa_arrays
     lam = np.diag(np.matmul(ksmm.T, ksmm))
-    sme = np.zeros((npvec, nv))
-    ste = np.zeros((npvec, nv))
-    vt = np.zeros(npvec)
-    for ii in range(npvec):
-        vt0 = 0
-        for jj in range(pu):
-            sme[ii, :] += lam[jj] * sa[jj]['sme'][ii, :] * sa[jj]['vt'][ii]
-            ste[ii, :] += lam[jj] * sa[jj]['ste'][ii, :] * sa[jj]['vt'][ii]
-            vt0 += lam[jj] * sa[jj]['vt'][ii]
-        sme[ii, :] /= vt0
-        ste[ii, :] /= vt0
-        vt[ii] = vt0
+    lam_vt = lam[:, None] * sa_arrays['vt']
+    vt = np.sum(lam_vt, 0)
+    sme = np.sum(lam_vt[:, :, None] * sa_arrays['sme'], 0) / vt[:, None]
+    ste = np.sum(lam_vt[:, :, None] * sa_arrays['ste'], 0) / vt[:, None]
 
     smePm = np.squeeze(np.mean(sme, 0))
     stePm = np.squeeze(np.mean(ste, 0))
 
     # If varlist is not None, compute sie/siePm
     if varlist is not None:
-        sie = np.zeros((npvec, len(varlist)))
-        for ii in range(npvec):
-            for jj in range(pu):
-                sie[ii, :] += lam[jj] * sa[jj]['sie'][ii, :] * sa[jj]['vt'][ii]
-            sie[ii, :] /= vt[ii]
+        sie = np.sum(lam_vt[:, :, None] * sa_arrays['sie'], 0) / vt[:, None]
         siePm = np.squeeze(np.mean(sie, 0))
 
     # If jelist is not None, compute sje/sjePm
     if jelist is not None:
-        sje = np.zeros((npvec, len(jelist)))
-        for ii in range(npvec):
-            for jj in range(pu):
-                sje[ii, :] += lam[jj] * sa[jj]['sje'][ii, :] * sa[jj]['vt'][ii]
-            sje[ii, :] /= vt[ii]
+        sje = np.sum(lam_vt[:, :, None] * sa_arrays['sje'], 0) / vt[:, None]
         sjePm = np.squeeze(np.mean(sje, 0))
         
     # unscaling
@@ -156,15 +149,21 @@ def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, r
     mef_m = np.zeros((pu, nv, ksmm.shape[0], ngrid))
     mef_sd = np.zeros((pu, nv, ksmm.shape[0], ngrid))
     
-    meanmat = np.tile(ymean, (ngrid, 1)).T
-    ysdmat = np.tile(ysd, (ngrid, 1)).T
+    # broadcast over the grid axis of the (nK, ngrid) main effect functions
+    meanmat = ymean[:, None]
+    ysdmat = ysd[:, None]
     
+    # mean/variance over samples of the main effect functions of each basis component, shape (pu, nv, ngrid)
+    mef_m_mean = np.mean(sa_arrays['mef_m'], 1)
+    mef_m_var = np.var(sa_arrays['mef_m'], 1)
+    mef_v_mean = np.mean(sa_arrays['mef_v'], 1)
+    # Kronecker products of a basis column with grid functions are formed as broadcast outer products
     for jj in range(pu):
         e0 += ksmm[:, jj] * np.mean(sa[jj]['e0'])
         for kk in range(nv):
-            mef_m[jj, kk, :, :] = np.kron(ksmm[:, jj], np.mean(sa[jj]['mef_m'][:, kk, :],0).reshape((ngrid, -1))).T * ysdmat + meanmat
-            mef_sd[jj, kk, :, :] = np.sqrt(np.kron(ksmm[:, jj]**2, np.var(sa[jj]['mef_m'][:, kk, :],0).reshape((ngrid, -1))) +
-                                           np.kron(ksmm[:, jj]**2, np.mean(sa[jj]['mef_v'][:, kk ,:],0).reshape(ngrid, -1))).T * ysdmat
+            mef_m[jj, kk, :, :] = ksmm[:, jj][:, None] * mef_m_mean[jj][kk][None, :] * ysdmat + meanmat
+            mef_sd[jj, kk, :, :] = np.sqrt((ksmm[:, jj]**2)[:, None] * mef_m_var[jj][kk][None, :] +
+                                           (ksmm[:, jj]**2)[:, None] * mef_v_mean[jj][kk][None, :]) * ysdmat
     e0 = e0 * ysd + ymean
     
     a = mef_m.shape
@@ -172,10 +171,8 @@ def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, r
     for kk in range(nv):
         tmef_m[kk, :, :] -= (pu - 1) * meanmat
     tmef_m.squeeze()
-    tmef_sd = np.zeros(a[1:4])
-    for jj in range(nv):
-        for kk in range(pu):
-            tmef_sd[jj, :, :] = tmef_sd[jj, :, :].reshape((-1, ngrid)) + np.kron(ksmm[:, kk]**2, np.reshape(np.mean(sa[kk]['mef_v'][:, jj, :], 0), (ngrid, -1))).T
+    # sum over basis components of the squared-basis weighted mean variances, shape (nv, nK, ngrid)
+    tmef_sd = np.einsum('ik,kjh->jih', ksmm**2, mef_v_mean)
     tmp = np.zeros((npvec, a[1], a[3]))
     for ii in range(ksmm.shape[0]):
         for jj in range(nv):
@@ -189,32 +186,41 @@ def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, r
     if varlist is not None:
         jef_m = np.zeros((pu, len(varlist), ngrid * ksmm.shape[0], ngrid))
         jef_sd = np.zeros(jef_m.shape)
-        meanmat = np.tile(ymean, (ngrid, ngrid))
-        ysdmat = np.tile(ysd, (ngrid, ngrid))
+        nK = ksmm.shape[0]
+        # mean/variance over samples of the joint effect functions of each basis component, shape (pu, len(varlist), ngrid, ngrid)
+        jef_m_mean = np.mean(sa_arrays['jef_m'], 1)
+        jef_m_var = np.var(sa_arrays['jef_m'], 1)
+        jef_v_mean = np.mean(sa_arrays['jef_v'], 1)
         for jj in range(pu):
             for kk in range(len(varlist)):
-                jef_m[jj, kk, :, :] = np.transpose(np.kron(np.mean(sa[jj]['jef_m'][:, kk, :, :], 0).reshape((-1, ngrid)), ksmm[:, jj]) * ysdmat + meanmat)
-                jef_sd[jj, kk, :, :] = np.transpose(np.sqrt(np.kron(np.var(sa[jj]['jef_m'][:, kk, :, :], axis=0).reshape((-1, ngrid)), ksmm[:, jj]**2) +
-                                                    np.kron(np.mean(sa[jj]['jef_v'][:, kk, :, :], axis=0).reshape((-1, ngrid)), ksmm[:, jj]**2)) * ysdmat)
+                # kron(A, k) for an (ngrid, ngrid) A is A[:, :, None] * k, with the last two axes merged; ysd/ymean
+                # broadcast over that last (basis) axis before the merge
+                jef_m[jj, kk, :, :] = np.transpose((jef_m_mean[jj][kk][:, :, None] * ksmm[:, jj] * ysd + ymean).reshape((ngrid, -1)))
+                jef_sd[jj, kk, :, :] = np.transpose((np.sqrt(jef_m_var[jj][kk][:, :, None] * ksmm[:, jj]**2 +
+                                                             jef_v_mean[jj][kk][:, :, None] * ksmm[:, jj]**2) * ysd).reshape((ngrid, -1)))
         a = jef_m.shape
         tjef_m = np.sum(jef_m, 0).reshape(a[1:4])
-        for kk in range(len(varlist)):
-            tjef_m[kk, :, :] = tjef_m[kk, :, :].reshape(a[2:4]) - (pu-1)*meanmat.T
+        # rows of the (ngrid*nK, ngrid) joint functions are (grid, basis) pairs, so ymean/ysd broadcast over a
+        # (ngrid, nK, ngrid) view
+        tjef_m.reshape((a[1], ngrid, nK, ngrid))[...] -= (pu-1)*ymean[:, None]
         tjef_m.squeeze()
         tjef_sd = np.zeros((a[1], a[2], a[3]))
         for jj in range(len(varlist)):
             for kk in range(pu):
                 tjef_sd[jj, :, :] = tjef_sd[jj, :, :].reshape((-1, ngrid)) + \
-                                    np.kron(np.mean(sa[kk]['jef_v'][:, jj, :, :], axis=0).reshape((-1, ngrid)), ksmm[:, kk]**2).T
+                                    (jef_v_mean[kk][jj][:, :, None] * ksmm[:, kk]**2).reshape((ngrid, -1)).T
+        # tmp accumulates sum_kk ksmm[ii, kk] * jef_m[:, :, hh, :] of component kk over the (hh, ii) sequence (as in gSens.m),
+        # and its variance over samples at each step is added to row hh*nK + ii; a block of up to ngrid ii values is done
+        # at once (a cumulative sum), which keeps the temporary at the size of one jef_m array
         tmp = np.zeros((npvec, a[1], a[3]))
         for hh in range(ngrid):
-            for ii in range(ksmm.shape[0]):
-                for jj in range(len(varlist)):
-                    for kk in range(pu):
-                        tmp[:, jj, :] = tmp[:, jj, :].reshape((-1, ngrid)) + ksmm[ii, kk] * sa[kk]['jef_m'][:, jj, hh, :].reshape((-1, ngrid))
-                    tjef_sd[jj, (hh-1)*ksmm.shape[0]+ii, :] += np.var(tmp[:, jj, :], axis=0)
-        for kk in range(len(varlist)):
-            tjef_sd[kk, :, :] = np.sqrt(tjef_sd[kk, :, :].reshape((a[2], a[3]))) * ysdmat.T
+            for i0 in range(0, nK, ngrid):
+                i1 = min(i0 + ngrid, nK)
+                terms = sum(ksmm[i0:i1, kk][:, None] * sa[kk]['jef_m'][:, :, hh, None, :] for kk in range(pu))
+                cum = tmp[:, :, None, :] + np.cumsum(terms, axis=2) # (npvec, len(varlist), i1-i0, ngrid)
+                tjef_sd[:, hh*nK+i0:hh*nK+i1, :] += np.var(cum, axis=0)
+                tmp = cum[:, :, -1, :]
+        tjef_sd = (np.sqrt(tjef_sd).reshape((a[1], ngrid, nK, ngrid)) * ysd[:, None]).reshape(a[1:4])
         tjef_sd.squeeze()
     
     sens = {'sa':sa,
@@ -237,7 +243,24 @@ def sensitivity(model, samples_dict=None, ngrid=21, varlist=None, jelist=None, r
         sens['sjePm'] = sjePm
     return sens
             
-def component_sens(x, y, beta, lamUz, lamWs, xe, ngrid, varlist, jelist, rg, cat_ind):
+def _sa_alloc(lead_shape, p, ngrid, varlist, jelist):
+    # zeroed result arrays of component_sens, with leading shape (nmcmc,) for one component or (pu, nmcmc) for all
+    sa = {'e0': np.zeros(lead_shape),
+          'vt': np.zeros(lead_shape),
+          'sme': np.zeros(lead_shape + (p,)),
+          'ste': np.zeros(lead_shape + (p,)),
+          'mef_m': np.zeros(lead_shape + (p, ngrid)),
+          'mef_v': np.zeros(lead_shape + (p, ngrid))}
+    if varlist:
+        sa['sie'] = np.zeros(lead_shape + (len(varlist),))
+        sa['jef_m'] = np.zeros(lead_shape + (len(varlist), ngrid, ngrid))
+        sa['jef_v'] = np.zeros(lead_shape + (len(varlist), ngrid, ngrid))
+    if jelist:
+        sa['sje'] = np.zeros(lead_shape + (len(jelist),))
+    return sa
+
+def component_sens(x, y, beta, lamUz, lamWs, xe, ngrid, varlist, jelist, rg, cat_ind, out=None):
+    # out optionally gives the (zeroed) result dict to fill and return, e.g. views into arrays over all components
 
     diff = rg[:, 1] - rg[:, 0]
     nmcmc, p = beta.shape
@@ -245,70 +268,58 @@ def component_sens(x, y, beta, lamUz, lamWs, xe, ngrid, varlist, jelist, rg, cat
 
     # Calculate x distances
     xdist = SepiaDistCov(x, cat_ind=cat_ind)
-    xexdist = []
-    xedist = []
-    for ii in range(p):
-        xexdist.append(SepiaDistCov(xe[:, ii][:, None], x[:, ii][:, None], cat_ind=cat_ind[[ii]]))
-        xedist.append(SepiaDistCov(xe[:, ii][:, None], cat_ind=cat_ind[[ii]]))
-
+    # grid-to-x squared distances, (nxe, m, len(Js)) for each main effect (slices of one batched array) and joint effect
+    xe_sqdist_all = _cross_sqdist(xe, x, cat_ind[:p])
+    xexsq = [xe_sqdist_all[:, :, [ii]] for ii in range(p)]
     if varlist is not None:
         for ii in range(len(varlist)):
-            xte = np.array([(vi, vj) for vi in xe[:, varlist[ii][0]] for vj in xe[:, varlist[ii][1]]])
-            xexdist.append(SepiaDistCov(xte, x[:, varlist[ii]], cat_ind=cat_ind[np.array(varlist[ii])]))
-            xedist.append(SepiaDistCov(xte, cat_ind=cat_ind[np.array(varlist[ii])]))
-
-    # Calculate GP stuff
-    P = np.zeros((nmcmc, m, m))
-    Q = np.zeros((nmcmc, m, m))
-    My = np.zeros((m, nmcmc))
-    for ii in range(nmcmc):
-        betaei = beta[ii, :]
-        lamUzi = lamUz[ii]
-        lamWsi = lamWs[ii]
-
-        # eta cov for the data & prediction locations
-        S = xdist.compute_cov_mat(betaei, lamUzi, lamWsi)
-        P[ii, :, :] = np.linalg.inv(S)
-        My[:, ii] = np.linalg.solve(S, y)
-        Q[ii, :, :] = P[ii, :, :] - np.outer(My[:, ii], My[:, ii])
+            # joint grid, first variable varying slowest (the row-major order jef_m/jef_v are reshaped with)
+            xte_a, xte_b = np.meshgrid(xe[:, varlist[ii][0]], xe[:, varlist[ii][1]], indexing='ij')
+            xte = np.column_stack([xte_a.ravel(), xte_b.ravel()])
+            xexsq.append(_cross_sqdist(xte, x[:, varlist[ii]], cat_ind[np.array(varlist[ii])]))
 
     # Compute variance and functions
-    e0 = np.zeros(nmcmc)
+    sa = _sa_alloc((nmcmc,), p, ngrid, varlist, jelist) if out is None else out
+    e0 = sa['e0']
     e2 = np.zeros(nmcmc)
-    vt = np.zeros(nmcmc)
-    sme = np.zeros((nmcmc, p))
-    ste = np.zeros((nmcmc, p))
-    mef_m = np.zeros((nmcmc, p, ngrid))
-    mef_v = np.zeros((nmcmc, p, ngrid))
-
-    if varlist is not None:
-        sie = np.zeros((nmcmc, len(varlist)))
-        jef_m = np.zeros((nmcmc, len(varlist), ngrid, ngrid))
-        jef_v = np.zeros((nmcmc, len(varlist), ngrid, ngrid))
-        #ue = np.zeros(m)
-    else:
-        sie = None
-        jef_m = None
-        jef_v = None
-    if jelist is not None:
-        sje = np.zeros((nmcmc, len(jelist)))
-    else:
-        sje = None
+    vt = sa['vt']
+    sme = sa['sme']
+    ste = sa['ste']
+    mef_m = sa['mef_m']
+    mef_v = sa['mef_v']
+    sie = sa.get('sie')
+    jef_m = sa.get('jef_m')
+    jef_v = sa.get('jef_v')
+    sje = sa.get('sje')
+    # initial calculations that are elementwise in beta, for all samples at once: c1 (nmcmc, p), c3 (nmcmc, m, p)
+    c1_all = calc1(beta, diff)
+    c3_all = calc3(x[None, :, :], rg, beta[:, None, :], diff)
+    u2_all = np.prod(c3_all, 2)
+    # scratch buffers reused across samples: C2 (its skipped row stays zero) and the varf matrix, which each trace
+    # consumes before the next varf call overwrites it
+    C2_buf = np.zeros((int(m*(m+1)/2) + m, p))
+    Vf_buf = np.empty((m, m))
     for ii in range(nmcmc):
         betaei = beta[ii, :]
         lamUzi = lamUz[ii]
         lamWsi = lamWs[ii]
-        # initial calculations
-        c1 = calc1(betaei, diff)
-        C2 = calc2(x, xdist, m, rg, betaei, diff)
-        c3 = np.zeros((m, diff.shape[0]))
-        for jj in range(m):
-            c3[jj, :] = calc3(x[jj, :], rg, betaei, diff)
-        u2 = np.prod(c3, 1)
-        e2[ii] = np.prod(c1)/lamUzi-np.trace(np.squeeze(Q[ii, :, :]) @ varf(m, p, [], C2, u2))/lamUzi**2
-        e0[ii] = np.matmul(u2.T, My[:, ii])/lamUzi
+        # GP stuff: eta cov for the data locations; S is a covariance (SPD), so it is Cholesky factored (Li is the lower
+        # factor) and solves reuse the factor; Pi = inv(S) is only formed for the traces against the varf matrices, which
+        # need it explicitly, and then from the factor (_cho_inv) rather than by solving against the identity. The
+        # factors are only needed for the current sample, so no (nmcmc, m, m) stacks are kept; with option
+        # 'mean'/'median'/dict (nmcmc == 1) this is a single pass.
+        S = xdist.compute_cov_mat(betaei, lamUzi, lamWsi)
+        Li, _ = scipy.linalg.cho_factor(S, lower=True)
+        Myi = scipy.linalg.cho_solve((Li, True), y)
+        Pi = _cho_inv(Li)
+        c1 = c1_all[ii]
+        C2 = calc2(x, xdist, m, rg, betaei, diff, out=C2_buf)
+        c3 = c3_all[ii]
+        u2 = u2_all[ii]
+        e2[ii] = np.prod(c1)/lamUzi-_varf_trace(Pi, Myi, m, p, [], C2, u2, xdist.ind, Vf_buf)/lamUzi**2
+        e0[ii] = np.matmul(u2.T, Myi)/lamUzi
         # total variance
-        vt[ii] = 1/lamUzi - np.trace(np.squeeze(Q[ii, :, :]) @ varf(m, p, np.arange(p), C2, []))/lamUzi**2 - e2[ii]
+        vt[ii] = 1/lamUzi - _varf_trace(Pi, Myi, m, p, np.arange(p), C2, [], xdist.ind, Vf_buf)/lamUzi**2 - e2[ii]
         # 1:p might be an index so we need an arrange from 0 to p-1
         # main/total effect indices; main effect functions
         for jj in range(p):
@@ -316,15 +327,13 @@ def component_sens(x, y, beta, lamUz, lamWs, xe, ngrid, varlist, jelist, rg, cat
             ll = np.setxor1d(np.arange(p), Js)
             u1 = np.prod(c3[:, ll], 1)
             u4 = np.prod(c1[ll])
-            sme[ii, jj] = u4/lamUzi - np.trace(np.squeeze(Q[ii, :, :]) @ varf(m, p, Js, C2, u1))/lamUzi**2 - e2[ii]
+            sme[ii, jj] = u4/lamUzi - _varf_trace(Pi, Myi, m, p, Js, C2, u1, xdist.ind, Vf_buf)/lamUzi**2 - e2[ii]
             sme[ii, jj] = sme[ii, jj]/vt[ii]
-            ME = etae(Js, u1, u4, xexdist[jj], xedist[jj], betaei, lamUzi, lamWsi, My[:, ii], np.squeeze(P[ii, :, :]))
-            mef_m[ii, jj, :] = ME.m
-            mef_v[ii, jj, :] = ME.v
+            etae(Js, u1, u4, xexsq[jj], betaei, lamUzi, lamWsi, Myi, Li, mef_m[ii, jj, :], mef_v[ii, jj, :])
             ll = [jj]
             Js = np.setxor1d(np.arange(p), ll)
             u2 = np.prod(c3[:, ll], 1)
-            ste[ii, jj] = c1[ll]/lamUzi - np.trace(np.squeeze(Q[ii, :, :]) @ varf(m, p, Js, C2, u2))/lamUzi**2 - e2[ii]
+            ste[ii, jj] = c1[ll]/lamUzi - _varf_trace(Pi, Myi, m, p, Js, C2, u2, xdist.ind, Vf_buf)/lamUzi**2 - e2[ii]
             ste[ii, jj] = 1 - ste[ii, jj]/vt[ii]
         # two-factor interaction indices, joint effects
         if varlist is not None:
@@ -333,11 +342,11 @@ def component_sens(x, y, beta, lamUz, lamWs, xe, ngrid, varlist, jelist, rg, cat
                 ll = np.setxor1d(np.arange(p), Js)
                 u3 = np.prod(c3[:, ll], 1)
                 u5 = np.prod(c1[ll])
-                sie[ii, jj] = u5/lamUzi - np.trace(np.squeeze(Q[ii, :, :]) * varf(m, p, Js, C2, u3))/lamUzi**2 - e2[ii]
+                sie[ii, jj] = u5/lamUzi - _varf_trace(Pi, Myi, m, p, Js, C2, u3, xdist.ind, Vf_buf)/lamUzi**2 - e2[ii]
                 sie[ii, jj] = sie[ii, jj]/vt[ii] - sme[ii, varlist[jj][0]] - sme[ii, varlist[jj][1]]
-                JE = etae(Js, u3, u5, xexdist[p+jj], xedist[p+jj], betaei, lamUzi, lamWsi, My[:, ii], np.squeeze(P[ii, :, :]))
-                jef_m[ii, jj, :, :] = np.reshape(JE.m, (ngrid, ngrid))
-                jef_v[ii, jj, :, :] = np.reshape(JE.v, (ngrid, ngrid))
+                # the result arrays are C-contiguous (_sa_alloc), so the flattened (ngrid, ngrid) slots are views
+                etae(Js, u3, u5, xexsq[p+jj], betaei, lamUzi, lamWsi, Myi, Li,
+                     jef_m[ii, jj, :, :].reshape(-1), jef_v[ii, jj, :, :].reshape(-1))
         # joint effect indices
         if jelist is not None:
             for jj in range(len(jelist)):
@@ -345,81 +354,104 @@ def component_sens(x, y, beta, lamUz, lamWs, xe, ngrid, varlist, jelist, rg, cat
                 ll = np.setxor1d(np.arange(p), Js)
                 u6 = np.prod(c3[:, ll], 1)
                 u7 = np.prod(c1[ll])
-                sje[ii, jj] = u7/lamUzi - np.trace(np.squeeze(Q[ii, :, :]) * varf(m, p, Js, C2, u6))/lamUzi**2 - e2[ii]
+                sje[ii, jj] = u7/lamUzi - _varf_trace(Pi, Myi, m, p, Js, C2, u6, xdist.ind, Vf_buf)/lamUzi**2 - e2[ii]
                 sje[ii, jj] = sje[ii, jj]/vt[ii]
                 
-    sa = {'e0': e0,
-          'vt': vt,
-          'sme': sme,
-          'ste': ste,
-          'mef_m': mef_m,
-          'mef_v': mef_v}
-    if varlist:
-        sa['sie'] = sie
-        sa['jef_m'] = jef_m
-        sa['jef_v'] = jef_v
-    if jelist:
-        sa['sje'] = sje
     return sa
         
+def _cho_inv(L):
+    # inverse of S = L L' from its lower Cholesky factor (LAPACK potri, about a third of the work of two triangular
+    # solves against the identity); potri only fills the lower triangle, so it is mirrored to the upper
+    potri, = scipy.linalg.get_lapack_funcs(('potri',), (L,))
+    Sinv, info = potri(L, lower=1)
+    if info != 0:
+        raise np.linalg.LinAlgError('potri failed with info %d' % info)
+    Sinv = np.tril(Sinv)
+    return Sinv + np.tril(Sinv, -1).T
+
+def _cross_sqdist(data, data2, cat_ind):
+    # squared distances between all rows of data and data2 as in SepiaDistCov (categorical columns are 0.5 where the
+    # categories differ), but kept as a (n, m, p) array for one batched evaluation instead of one object per column
+    is_cat = cat_ind > 0
+    sqdist = np.square(data[:, None, :] - data2[None, :, :])
+    sqdist[:, :, is_cat] = 0.5*(data[:, None, is_cat] != data2[None, :, is_cat])
+    return sqdist
+
+def _tr_prod(A, B):
+    # trace(A @ B) as a sum of elementwise products, without forming A @ B
+    return np.einsum('ij,ji->', A, B)
+
+def _tr_Q(P, My, V):
+    # trace(Q @ V) for Q = P - My My', without forming Q: trace(P @ V) - My' V My
+    return _tr_prod(P, V) - My @ V @ My
+
+def _varf_trace(P, My, m, p, Js, C2, ef, ind, out=None):
+    # trace(Q @ varf(m, p, Js, C2, ef)) for Q = P - My My'; with numba, a compiled kernel sums it from the C2 rows without
+    # forming the varf matrix, otherwise varf (into out, if given) and _tr_Q are used
+    if HAVE_NUMBA:
+        Js = np.asarray(Js, dtype=np.intp)
+        ef = np.asarray(ef, dtype=float) if len(np.setxor1d(np.arange(p), Js)) != 0 else np.empty(0)
+        return _varf_trace_kernel(C2, Js, ef, ind[0], ind[1], P, My)
+    return _tr_Q(P, My, varf(m, p, Js, C2, ef, ind, out))
+
+# calc1 and calc3 are elementwise, so beta/x may carry leading (broadcast) dimensions, e.g. over MCMC samples
+# (standard normal cdf/pdf are evaluated directly with ndtr and the closed-form pdf, not through scipy.stats.norm)
 def calc1(beta, diff):
-    ncdf = scipy.stats.norm.cdf(np.sqrt(2 * beta) * diff)
-    npdf = scipy.stats.norm.pdf(np.sqrt(2 * beta) * diff)
+    z = np.sqrt(2 * beta) * diff
+    ncdf = scipy.special.ndtr(z)
+    npdf = np.exp(-z**2/2.0) / np.sqrt(2*np.pi)
     c1 = (np.sqrt(np.pi/beta) * diff * (2 * ncdf - 1) - (1/beta) * (1 - np.sqrt(2*np.pi) * npdf)) / np.square(diff)
     return c1
 
-def calc2(x ,xdist, m, rg, beta, diff):
-    kk = 0
-    C2 = np.zeros((int(m*(m+1)/2) + m, beta.shape[0]))
-    for ii in range(m):
-        for jj in range(ii+1, m):
-            mp = (x[ii, :] + x[jj, :])/2
-            di = np.where(np.logical_and(xdist.ind[0]==ii, xdist.ind[1]==jj))
-            C2[kk, :] = calc3(mp, rg, 2*beta, diff) * np.exp(-beta * xdist.sqdist[di, :]/2)
-            kk += 1
-    for ii in range(m):
-        kk += 1
-        C2[kk, :] = calc3(x[ii, :], rg, 2.*beta, diff)
+def calc2(x ,xdist, m, rg, beta, diff, out=None):
+    # Rows 0..npair-1 are the point pairs in xdist order (np.triu_indices, the layout of xdist.sqdist), evaluated at the pair
+    # midpoints; after one skipped row, the next m rows are the points themselves. All rows are computed at once.
+    # out optionally gives a zero-initialized buffer to fill and return (the skipped row and trailing rows are never written)
+    iu, ju = xdist.ind
+    npair = iu.shape[0]
+    C2 = np.zeros((int(m*(m+1)/2) + m, beta.shape[0])) if out is None else out
+    mp = (x[iu, :] + x[ju, :])/2
+    C2[:npair, :] = calc3(mp, rg, 2*beta, diff) * np.exp(-beta * xdist.sqdist/2)
+    C2[npair+1:npair+1+m, :] = calc3(x, rg, 2.*beta, diff)
     return C2
 
 def calc3(x, rg, beta, diff):
-    ncdf1 = scipy.stats.norm.cdf(np.sqrt(2 * beta) * (rg[:, 1] - x))
-    ncdf0 = scipy.stats.norm.cdf(np.sqrt(2 * beta) * (rg[:, 0] - x))
+    ncdf1 = scipy.special.ndtr(np.sqrt(2 * beta) * (rg[:, 1] - x))
+    ncdf0 = scipy.special.ndtr(np.sqrt(2 * beta) * (rg[:, 0] - x))
     c3 = np.sqrt(np.pi / beta) * (ncdf1 - ncdf0) / diff
     return c3
 
-def varf(m,p,Js,C2,ef):
-    kk = 0
+def varf(m,p,Js,C2,ef,ind=None,out=None):
+    # Rows of C2 are the m*(m-1)/2 upper triangle pairs in np.triu_indices order, then (after one skipped row) the m diagonal
+    # entries; ind optionally passes in those upper triangle indices, e.g. xdist.ind, so they are not rebuilt on every call.
+    # out optionally gives an (m, m) buffer to fill and return; every entry is overwritten, so it need not be zeroed
+    iu, ju = np.triu_indices(m, k=1) if ind is None else ind
+    npair = iu.shape[0]
+    Js = np.asarray(Js, dtype=int)
     ll = np.setxor1d(np.arange(p), Js)
-    Vf = np.zeros((m, m))
-    for ii in range(m-1):
-        for jj in range(ii+1, m):
-            Vf[ii, jj] = 1
-            if len(Js) != 0: Vf[ii, jj] = np.prod(C2[kk, Js])
-            if len(ll) != 0: Vf[ii, jj] = Vf[ii, jj] * ef[ii] * ef[jj]
-            kk += 1
-    Vf = Vf + Vf.T
-    for ii in range(m):
-        kk += 1
-        Vf[ii, ii] = 1
-        if len(Js) != 0: Vf[ii, ii] = np.prod(C2[kk, Js])
-        if len(ll) != 0: Vf[ii, ii] = Vf[ii,ii] * (ef[ii]**2)
+    Vf = np.empty((m, m)) if out is None else out
+    vals = np.ones(npair)
+    if len(Js) != 0: vals = np.prod(C2[:npair, Js], axis=1)
+    if len(ll) != 0: vals = vals * ef[iu] * ef[ju]
+    Vf[iu, ju] = vals
+    Vf[ju, iu] = vals
+    dvals = np.ones(m)
+    if len(Js) != 0: dvals = np.prod(C2[npair+1:npair+1+m, Js], axis=1)
+    if len(ll) != 0: dvals = dvals * (ef**2)
+    Vf[np.diag_indices(m)] = dvals
     return Vf
 
-class ee_struct:
-    def __init__(self, m_dim, v_dim):
-        self.m = np.zeros(m_dim)
-        self.v = np.zeros(v_dim)
-
-def etae(Js, ef, vf, xexdist, xedist, beta, lamUz, lamWs, My, P):
-    nxe = xedist.n
-    ee = ee_struct(m_dim=nxe, v_dim=nxe)
-    Ct = xexdist.compute_cov_mat(beta[np.array(Js)].T, lamUz)
-    Ct = Ct * np.tile(ef.T, (nxe, 1))
-    ee.m = np.matmul(Ct, My)
-    C = xedist.compute_cov_mat(beta[np.array(Js)].T, lamUz, lamWs)
-    ee.v = np.diag(C*vf - np.matmul(np.matmul(Ct, P), Ct.T))
-    return ee
+def etae(Js, ef, vf, xexsq, beta, lamUz, lamWs, My, L, out_m, out_v):
+    # xexsq holds the squared distances from the nxe grid points to x in the Js variables, shape (nxe, m, len(Js));
+    # L is the lower Cholesky factor of the data covariance S. The effect function mean and variance at the grid points
+    # are written into out_m and out_v, shape (nxe,)
+    Ct = np.exp(-(xexsq @ beta[np.array(Js)])) / lamUz
+    Ct = Ct * ef[None, :]
+    np.matmul(Ct, My, out=out_m)
+    # only the diagonal of C - Ct S^-1 Ct' is kept; the diagonal of C is 1/lamUz + 1/lamWs for every grid point, and
+    # diag(Ct S^-1 Ct') is the column sums of squares of W = L^-1 Ct' (one triangular solve, S^-1 never formed)
+    W = scipy.linalg.solve_triangular(L, Ct.T, lower=True)
+    np.subtract((1/lamUz + 1/lamWs)*vf, np.einsum('ij,ij->j', W, W), out=out_v)
 
 
 
@@ -0,0 +1,91 @@
+import numpy as np
+
+# numba is optional (pip install sepia[numba]); without it the NumPy versions below are used. The loop kernels are plain
+# Python functions, compiled with njit when numba is present, so their bodies can also be tested without numba
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+
+def _interp_rows_loop(x, xp, fp, out):
+    # out[:, j] = np.interp(x[j], xp, fp[i]) for rows i, with one search of xp per x[j] reused across the rows.
+    # No fastmath, so results match np.interp exactly.
+    n = xp.shape[0]
+    for j in prange(x.shape[0]):
+        xj = x[j]
+        if xj <= xp[0]:
+            out[:, j] = fp[:, 0]
+        elif xj >= xp[n - 1]:
+            out[:, j] = fp[:, n - 1]
+        else:
+            k = np.searchsorted(xp, xj, side='right') - 1
+            dx = xp[k + 1] - xp[k]
+            for i in range(fp.shape[0]):
+                out[i, j] = (fp[i, k + 1] - fp[i, k]) / dx * (xj - xp[k]) + fp[i, k]
+
+
+def _varf_trace_loop(C2, Js, ef, iu, ju, P, My):
+    # trace((P - My My') Vf) for the sensitivity varf matrix Vf (symmetric, as is P), summed entry by entry from the
+    # C2 rows (upper triangle pairs, one skipped row, then the diagonal) without forming Vf. ef may be empty, in
+    # which case it is not applied.
+    npair = iu.shape[0]
+    m = My.shape[0]
+    use_ef = ef.shape[0] > 0
+    acc_pair = 0.0
+    for k in prange(npair):
+        i = iu[k]
+        j = ju[k]
+        v = 1.0
+        for js in Js:
+            v *= C2[k, js]
+        if use_ef:
+            v *= ef[i] * ef[j]
+        acc_pair += 2.0 * v * (P[i, j] - My[i] * My[j])
+    acc_diag = 0.0
+    for i in prange(m):
+        v = 1.0
+        for js in Js:
+            v *= C2[npair + 1 + i, js]
+        if use_ef:
+            v *= ef[i] * ef[i]
+        acc_diag += v * (P[i, i] - My[i] * My[i])
+    return acc_pair + acc_diag
+
+
+if HAVE_NUMBA:
+    _interp_rows_kernel = njit(parallel=True, cache=True)(_interp_rows_loop)
+    _varf_trace_kernel = njit(parallel=True, cache=True)(_varf_trace_loop)
+
+
+def interp_rows(x, xp, fp):
+    """
+    Linear interpolation of each row of fp, equivalent to np.interp(x, xp, fp[i]) for every row i, but with one search of xp
+    shared by all rows.
+
+    :param numpy.ndarray x: points to interpolate to
+    :param numpy.ndarray xp: increasing points at which fp is given, shape (ell, )
+    :param numpy.ndarray fp: values at xp, shape (ell, ) or (k, ell)
+    :return: interpolated values in the floating point dtype of fp (float64 for integer fp), shape x.shape or (k, ) + x.shape
+    """
+    x = np.asarray(x, dtype=float)
+    xp = np.asarray(xp, dtype=float).ravel()
+    dtype = np.result_type(fp, np.float32)
+    fp = np.asarray(fp, dtype=dtype)
+    if xp.shape[0] < 2:
+        return np.broadcast_to(fp[..., :1], fp.shape[:-1] + (x.size,)).reshape(fp.shape[:-1] + x.shape).copy()
+    xf = x.ravel()
+    if HAVE_NUMBA:
+        fp2 = np.ascontiguousarray(fp.reshape((-1, xp.shape[0])))
+        res = np.empty((fp2.shape[0], xf.shape[0]), dtype=dtype)
+        _interp_rows_kernel(np.ascontiguousarray(xf), xp, fp2, res)
+        return res.reshape(fp.shape[:-1] + x.shape)
+    # bracketing interval xp[j] <= x < xp[j+1], with x outside of [xp[0], xp[-1]] clamped to the end values like np.interp
+    j = np.clip(np.searchsorted(xp, xf, side='right') - 1, 0, xp.shape[0] - 2)
+    slope = (fp[..., j + 1] - fp[..., j]) / (xp[j + 1] - xp[j])
+    res = (slope * (xf - xp[j]) + fp[..., j]).astype(dtype, copy=False)
+    res[..., xf <= xp[0]] = fp[..., :1]
+    res[..., xf >= xp[-1]] = fp[..., -1:]
+    return res.reshape(fp.shape[:-1] + x.shape)
@@ -19,7 +19,10 @@ setup(name='sepia',
             'seaborn',
             'statsmodels',
             'tqdm'
-            ]
+            ],
+      extras_require={
+            'numba': ['numba']  # optional compiled kernels (sepia/_kernels.py)
+            }
       )
 
 
@@ -51,4 +51,61 @@ class DataContainerTestCase(unittest.TestCase):
         self.assertEqual(self.dc4.t.shape, (self.n, 5), 'incorrect t size')
         self.assertEqual(self.dc4.y_ind.shape[0], self.dc4.y.shape[1], 'y/y_ind shape mismatch')
 
+    def test_Sigy_chol(self):
+        # Validation keeps the Cholesky factor of Sigy
+        ell = 50
+        A = np.random.uniform(-1, 1, (ell, ell))
+        Sigy = A @ A.T + ell * np.eye(ell)
+        dc = DataContainer(x=np.random.uniform(-1, 2, (1, 3)), y=np.random.uniform(-3, 5, (1, ell)),
+                           y_ind=np.linspace(0, 10, ell), Sigy=Sigy)
+        self.assertTrue(np.allclose(dc.Sigy_chol @ dc.Sigy_chol.T, Sigy), 'incorrect Sigy_chol')
+        self.assertTrue(np.allclose(dc.Sigy_chol, np.tril(dc.Sigy_chol)), 'Sigy_chol not lower triangular')
+        self.assertIsNone(self.dc4.Sigy_chol)
+        # Not positive definite
+        with self.assertRaises(ValueError):
+            DataContainer(x=np.random.uniform(-1, 2, (1, 3)), y=np.random.uniform(-3, 5, (1, ell)),
+                          y_ind=np.linspace(0, 10, ell), Sigy=-Sigy)
+
+    def test_ragged_y_layout(self):
+        # Ragged y elements are views into one contiguous buffer
+        dc = self.dc6
+        self.assertTrue(dc.y_flat.flags['C_CONTIGUOUS'])
+        self.assertEqual(dc.y_offsets[-1], dc.y_flat.shape[0])
+        for i, yel in enumerate(dc.y):
+            self.assertEqual(yel.shape, dc.y_ind[i].shape, 'y/y_ind shape mismatch')
+            self.assertTrue(np.shares_memory(yel, dc.y_flat))
+            self.assertTrue(np.array_equal(yel, dc.y_flat[dc.y_offsets[i]:dc.y_offsets[i+1]]))
+            self.assertTrue(np.array_equal(dc.y_ind[i], dc.y_ind_flat[dc.y_offsets[i]:dc.y_offsets[i+1]]))
+        self.assertIsNone(self.dc4.y_flat)
+        self.assertIsNone(self.dc4.y_ind_flat)
+
+    def test_ragged_Sigy(self):
+        # Ragged obs take a list of Sigy matching each observation's length
+        y_ell = [len(yel) for yel in self.dc6.y]
+        Sigy = [0.1 * np.eye(ell) for ell in y_ell]
+        dc = DataContainer(x=self.dc6.x, y=self.dc6.y, y_ind=self.dc6.y_ind, Sigy=Sigy)
+        self.assertEqual(len(dc.Sigy_chol), self.n)
+        for i in range(self.n):
+            self.assertTrue(np.allclose(dc.Sigy_chol[i], np.sqrt(0.1) * np.eye(y_ell[i])), 'incorrect Sigy_chol')
+        # Size mismatch with one observation
+        Sigy[0] = 0.1 * np.eye(y_ell[0] + 1)
+        with self.assertRaises(ValueError):
+            DataContainer(x=self.dc6.x, y=self.dc6.y, y_ind=self.dc6.y_ind, Sigy=Sigy)
+
+    def test_xyt_layout(self):
+        # Contiguous inputs are used without copying; strided inputs are made contiguous
+        x = np.random.uniform(-1, 2, (self.n, 3))
+        y = np.random.uniform(-3, 5, self.n)
+        tx = np.random.uniform(-5, 5, (self.n, 6))
+        y_ind = np.linspace(0, 1, 2 * self.n)
+        dc = DataContainer(x=x, y=tx[:, :2], t=tx[:, ::2], y_ind=y_ind[::10])
+        self.assertTrue(dc.y_ind.flags['C_CONTIGUOUS'])
+        self.assertTrue(np.array_equal(dc.y_ind, y_ind[::10]))
+        dc = DataContainer(x=x, y=y, t=tx[:, ::2])
+        self.assertTrue(np.shares_memory(dc.x, x))
+        self.assertTrue(np.shares_memory(dc.y, y))
+        self.assertEqual(dc.y.shape, (self.n, 1), 'incorrect y size')
+        for a in [dc.x, dc.y, dc.t]:
+            self.assertTrue(a.flags['C_CONTIGUOUS'])
+        self.assertTrue(np.array_equal(dc.t, tx[:, ::2]))
 
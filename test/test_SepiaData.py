@@ -434,6 +434,9 @@ class SepiaDataTestCase(unittest.TestCase):
 
         d.create_K_basis(3)
         self.assertTrue(d.sim_data.K.shape == (pu, ell_sim))
+        for i in range(n):
+            K_obs = np.vstack([np.interp(y_ind_obs[i], y_ind_sim, k) for k in d.sim_data.K])
+            self.assertTrue(np.array_equal(d.obs_data.K[i], K_obs))
         d.create_D_basis()
         print(d)
 
@@ -504,4 +507,300 @@ class SepiaDataTestCase(unittest.TestCase):
         self.assertEqual(d.transform_xt(t=1,native=True)[1].flatten(),d.sim_data.orig_t_max.flatten())
         
         
-        
\ No newline at end of file
+        
+
+    def test_float32_dtype(self):
+        """
+        Tests that data stored as float32 gives arrays of that dtype and model log likelihood close to float64.
+        """
+        from sepia.SepiaModel import SepiaModel
+        np.random.seed(42)
+        m = 50
+        n = 3
+        y_ind = np.linspace(0, 1, 20)
+        t = np.random.uniform(0, 1, (m, 2))
+        y = np.sin(np.outer(t[:, 0], 5 * y_ind)) + t[:, [1]]
+        y_obs = np.sin(np.outer(np.array([0.2, 0.5, 0.7]), 5 * y_ind)) + 0.5
+
+        print('Testing float32 SepiaData...')
+        lls = []
+        for dtype in [None, np.float32]:
+            d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind,
+                          Sigy=0.01 * np.eye(y_ind.shape[0]), dtype=dtype)
+            d.transform_xt()
+            d.standardize_y()
+            d.create_K_basis(3)
+            d.create_D_basis('linear')
+            if dtype is not None:
+                self.assertEqual(d.sim_data.y.dtype, dtype)
+                self.assertEqual(d.sim_data.y_std.dtype, dtype)
+                self.assertEqual(d.sim_data.K.dtype, dtype)
+                self.assertEqual(d.sim_data.t_trans.dtype, dtype)
+                self.assertEqual(d.obs_data.y.dtype, dtype)
+                self.assertEqual(d.obs_data.Sigy.dtype, np.float64)
+                self.assertEqual(d.obs_data.Sigy_std.dtype, np.float64)
+            lls.append(SepiaModel(d).logLik())
+        self.assertTrue(np.allclose(lls[0], lls[1], rtol=1e-4))
+
+    def test_standardize_y_inplace(self):
+        """
+        Tests that in-place standardization matches the default and reuses the sim y buffer.
+        """
+        np.random.seed(42)
+        m = 100
+        y_ind = np.linspace(0, 1, 30)
+        t = np.random.uniform(0, 1, (m, 2))
+        y = np.sin(np.outer(t[:, 0], 5 * y_ind)) + t[:, [1]]
+        y_obs = np.sin(np.outer(np.array([0.2, 0.5]), 5 * y_ind)) + 0.5
+
+        print('Testing in-place standardize_y...')
+        for scale in ['scalar', 'columnwise', False]:
+            d = SepiaData(t_sim=t, y_sim=y.copy(), y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind)
+            d.standardize_y(scale=scale)
+            self.assertFalse(np.shares_memory(d.sim_data.y_std, d.sim_data.y))
+            self.assertTrue(np.array_equal(d.sim_data.y, y))
+            d_inplace = SepiaData(t_sim=t, y_sim=y.copy(), y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind)
+            d_inplace.standardize_y(scale=scale, inplace=True)
+            self.assertTrue(d_inplace.sim_data.y_std is d_inplace.sim_data.y)
+            self.assertTrue(np.allclose(d.sim_data.y_std, d_inplace.sim_data.y_std))
+            self.assertTrue(np.allclose(d.obs_data.y_std, d_inplace.obs_data.y_std))
+        d = SepiaData(t_sim=t, y_sim=np.ones((m, 30), dtype=int), y_ind_sim=y_ind)
+        with self.assertRaises(ValueError):
+            d.standardize_y(inplace=True)
+
+    def test_standardize_y_sd(self):
+        """
+        Tests that the sim SD matches np.std, including for data with a large offset, without centering, and with a
+        given y_mean.
+        """
+        np.random.seed(42)
+        m, ell = 200, 30
+        y = 1e6 + np.random.normal(size=(m, ell)) * np.linspace(1, 2, ell)
+        d = SepiaData(t_sim=np.random.uniform(0, 1, (m, 2)), y_sim=y, y_ind_sim=np.linspace(0, 1, ell))
+        d.standardize_y(scale='scalar')
+        self.assertTrue(np.isclose(d.sim_data.orig_y_sd, np.std(y - np.mean(y, 0), ddof=1), rtol=1e-10))
+        d.standardize_y(scale='columnwise')
+        self.assertTrue(np.allclose(d.sim_data.orig_y_sd, np.std(y, ddof=1, axis=0), rtol=1e-10))
+        # uncentered or given-mean y need not have zero mean, so the SD is still about the mean of y - y_mean
+        y = 5 + np.random.uniform(size=(30, ell))
+        d = SepiaData(t_sim=np.random.uniform(0, 1, (30, 2)), y_sim=y, y_ind_sim=np.linspace(0, 1, ell))
+        y_mean = np.full(ell, 4.)
+        for kwargs, y_dm in [(dict(center=False), y), (dict(y_mean=y_mean), y - y_mean)]:
+            d.standardize_y(scale='scalar', **kwargs)
+            self.assertTrue(np.isclose(d.sim_data.orig_y_sd, np.std(y_dm, ddof=1), rtol=1e-10))
+            d.standardize_y(scale='columnwise', **kwargs)
+            self.assertTrue(np.allclose(d.sim_data.orig_y_sd, np.std(y_dm, ddof=1, axis=0), rtol=1e-10))
+
+    def test_Sigy_std_chol(self):
+        """
+        Tests that the cached Sigy_std factor and log determinant match Sigy_std, for dense and ragged obs.
+        """
+        np.random.seed(42)
+        m = 100
+        y_ind = np.linspace(0, 1, 30)
+        t = np.random.uniform(0, 1, (m, 2))
+        y = np.sin(np.outer(t[:, 0], 5 * y_ind)) + t[:, [1]]
+        y_obs = np.sin(np.outer(np.array([0.2, 0.5]), 5 * y_ind)) + 0.5
+        A = np.random.uniform(-1, 1, (30, 30))
+        Sigy = 0.01 * (A @ A.T + 30 * np.eye(30))
+
+        print('Testing Sigy_std Cholesky factor...')
+        for scale in ['scalar', 'columnwise']:
+            d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind, Sigy=Sigy)
+            d.standardize_y(scale=scale)
+            L = d.obs_data.Sigy_std_chol
+            self.assertTrue(np.allclose(L @ L.T, d.obs_data.Sigy_std))
+            self.assertTrue(np.allclose(d.obs_data.Sigy_std_logdet, np.linalg.slogdet(d.obs_data.Sigy_std)[1]))
+            d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=[y_obs[0], y_obs[1, :20]],
+                          y_ind_obs=[y_ind, y_ind[:20]], Sigy=[Sigy, Sigy[:20, :20]])
+            d.standardize_y(scale=scale)
+            for i in range(2):
+                L = d.obs_data.Sigy_std_chol[i]
+                self.assertTrue(np.allclose(L @ L.T, d.obs_data.Sigy_std[i]))
+                self.assertTrue(np.allclose(d.obs_data.Sigy_std_logdet[i], np.linalg.slogdet(d.obs_data.Sigy_std[i])[1]))
+        d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind)
+        d.standardize_y()
+        self.assertTrue(np.allclose(d.obs_data.Sigy_std_chol, np.eye(30)))
+        self.assertEqual(d.obs_data.Sigy_std_logdet, 0)
+
+    def test_K_basis_gram(self):
+        """
+        Tests that the opt-in Gram matrix eigendecomposition PCA basis for tall y_sim matches the SVD basis up to sign, with
+        each PC's largest magnitude entry positive, and that the default basis is the SVD basis.
+        """
+        np.random.seed(42)
+        ell = 20
+        y_ind = np.linspace(0, 1, ell)
+        for m in [100, 10]:
+            t = np.random.uniform(0, 1, (m, 2))
+            y = np.sin(4 * t[:, 0:1] + 6 * y_ind[None, :]) * t[:, 1:2] + 0.1 * np.random.normal(size=(m, ell))
+            d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind)
+            d.standardize_y()
+            U, s, _ = np.linalg.svd(d.sim_data.y_std.T, full_matrices=False)
+            for n_pc in [5, 0.95]:
+                pu = 5 if n_pc == 5 else np.sum(np.cumsum(s ** 2) / np.sum(s ** 2) < n_pc) + 1
+                K = (U[:, :pu] * s[:pu]).T / np.sqrt(m)
+                d.create_K_basis(n_pc)
+                self.assertTrue(np.array_equal(d.sim_data.K, K))
+                d.create_K_basis(n_pc, gram=True)
+                self.assertEqual(d.sim_data.K.shape[0], pu)
+                signs = np.sign(np.sum(K * d.sim_data.K, axis=1, keepdims=True))
+                self.assertTrue(np.allclose(signs * d.sim_data.K, K))
+                if m >= ell:
+                    K_gram = d.sim_data.K
+                    self.assertTrue(np.all(K_gram[np.arange(pu), np.argmax(np.abs(K_gram), axis=1)] > 0))
+            # a y_std set by hand in Fortran order gives the same basis
+            K = d.sim_data.K
+            d.sim_data.y_std = np.asfortranarray(d.sim_data.y_std)
+            d.create_K_basis(n_pc, gram=True)
+            self.assertTrue(np.allclose(d.sim_data.K, K))
+
+    def test_y_std_float32(self):
+        """
+        Tests that float32 y_std gives sim and obs K bases that stay float32 and match the float64 reference.
+        """
+        np.random.seed(42)
+        m, ell = 50, 30
+        y_ind = np.linspace(0, 1, ell)
+        t = np.random.uniform(0, 1, (m, 2))
+        y = np.sin(4 * t[:, 0:1] + 6 * y_ind[None, :]) * t[:, 1:2] + 0.1 * np.random.normal(size=(m, ell))
+        y_obs = y[:3] + 0.05 * np.random.normal(size=(3, ell))
+        d64 = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind)
+        d64.standardize_y()
+        d64.create_K_basis(5)
+        d32 = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind)
+        d32.standardize_y(dtype=np.float32)
+        self.assertEqual(d32.sim_data.y_std.dtype, np.float32)
+        self.assertEqual(d32.obs_data.y_std.dtype, np.float32)
+        self.assertTrue(np.allclose(d32.sim_data.y_std, d64.sim_data.y_std, atol=1e-5))
+        d32.create_K_basis(5)
+        s64 = np.linalg.norm(d64.sim_data.K, axis=1)
+        s32 = np.linalg.norm(d32.sim_data.K, axis=1)
+        self.assertTrue(np.allclose(s32, s64, rtol=1e-4))
+        self.assertEqual(d32.obs_data.K.dtype, np.float32)
+        self.assertTrue(np.allclose(np.linalg.norm(d32.obs_data.K, axis=1), np.linalg.norm(d64.obs_data.K, axis=1), rtol=1e-4))
+        with self.assertRaises(ValueError):
+            d32.standardize_y(inplace=True, dtype=np.float32)
+        # with float32 inputs, the obs mean/SD interpolated from the sim ones stay float32 too
+        d32 = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind, y_obs=y_obs, y_ind_obs=y_ind, dtype=np.float32)
+        d32.standardize_y(scale='columnwise')
+        for attr in ['orig_y_mean', 'orig_y_sd', 'y_std']:
+            self.assertEqual(getattr(d32.obs_data, attr).dtype, np.float32)
+
+    def test_interp_rows(self):
+        """
+        Tests that interp_rows matches np.interp row by row, including points outside the interpolation range.
+        """
+        from sepia.SepiaData import interp_rows
+        np.random.seed(42)
+        xp = np.sort(np.random.uniform(0, 1, 25))
+        fp = np.random.normal(size=(4, 25))
+        x = np.concatenate([np.random.uniform(-0.5, 1.5, 40), xp[[0, 3, -1]]])
+        res = interp_rows(x, xp, fp)
+        self.assertEqual(res.shape, (4, x.shape[0]))
+        for i in range(4):
+            self.assertTrue(np.allclose(res[i], np.interp(x, xp, fp[i]), rtol=0, atol=1e-14))
+        self.assertTrue(np.allclose(interp_rows(x, xp, fp[0]), np.interp(x, xp, fp[0]), rtol=0, atol=1e-14))
+        # the numba kernel body, run as plain Python (it is only compiled when numba is installed)
+        from sepia._kernels import _interp_rows_loop
+        res = np.empty((4, x.shape[0]))
+        _interp_rows_loop(x, xp, fp, res)
+        for i in range(4):
+            self.assertTrue(np.allclose(res[i], np.interp(x, xp, fp[i]), rtol=0, atol=1e-14))
+
+    def test_K_basis_truncated(self):
+        """
+        Tests that the default PCA basis for wide y_sim is the full SVD basis, and that the opt-in truncated SVD basis
+        matches it up to sign, with each PC's largest magnitude entry positive.
+        """
+        np.random.seed(42)
+        m, ell = 120, 400
+        y_ind = np.linspace(0, 1, ell)
+        t = np.random.uniform(0, 1, (m, 2))
+        y = np.sin(4 * t[:, 0:1] + 6 * y_ind[None, :]) * t[:, 1:2] + 0.1 * np.random.normal(size=(m, ell))
+        d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind)
+        d.standardize_y()
+        for n_pc in [3, 0.999]:
+            d.create_K_basis(n_pc)
+            K = d.sim_data.K
+            d.create_K_basis(n_pc, full_svd=True)
+            self.assertTrue(np.array_equal(K, d.sim_data.K))
+        d.create_K_basis(3, full_svd=True)
+        K_svd = d.sim_data.K
+        d.create_K_basis(3, truncated=True)
+        K = d.sim_data.K
+        self.assertEqual(K.shape, K_svd.shape)
+        signs = np.sign(np.sum(K * K_svd, axis=1, keepdims=True))
+        self.assertTrue(np.allclose(signs * K, K_svd))
+        self.assertTrue(np.all(K[np.arange(K.shape[0]), np.argmax(np.abs(K), axis=1)] > 0))
+        with self.assertRaises(ValueError):
+            d.create_K_basis(0.5, truncated=True)
+
+    def test_K_orthonormal(self):
+        """
+        Tests that a user K declared orthonormal is checked, and gives the same sim weights as the general solve.
+        """
+        from sepia.SepiaPlot import _sim_weights
+        np.random.seed(42)
+        m, ell = 40, 30
+        y_ind = np.linspace(0, 1, ell)
+        d = SepiaData(t_sim=np.random.uniform(0, 1, (m, 2)), y_sim=np.random.normal(size=(m, ell)), y_ind_sim=y_ind)
+        d.standardize_y()
+        Q, _ = np.linalg.qr(np.random.normal(size=(ell, 4)))
+        d.create_K_basis(K=Q.T)
+        self.assertFalse(d.sim_data.K_orthonormal)
+        w = _sim_weights(d)
+        d.create_K_basis(K=Q.T, k_is_orthonormal=True)
+        self.assertTrue(d.sim_data.K_orthonormal)
+        self.assertTrue(np.allclose(_sim_weights(d), w))
+        with self.assertRaises(ValueError):
+            d.create_K_basis(K=2 * Q.T, k_is_orthonormal=True)
+        d.create_K_basis(3)
+        self.assertFalse(d.sim_data.K_orthonormal)
+
+    def test_obs_weights_cache(self):
+        """
+        Tests that the cached obs K/D weights are reused for the same arrays and recomputed when one is replaced directly.
+        """
+        from sepia.SepiaPlot import _obs_weights
+        np.random.seed(42)
+        m, ell = 40, 30
+        y_ind = np.linspace(0, 1, ell)
+        d = SepiaData(t_sim=np.random.uniform(0, 1, (m, 2)), y_sim=np.random.normal(size=(m, ell)), y_ind_sim=y_ind,
+                      y_obs=np.random.normal(size=(2, ell)), y_ind_obs=y_ind)
+        d.standardize_y()
+        d.create_K_basis(4)
+        u, v = _obs_weights(d)
+        self.assertIsNone(v)
+        self.assertIs(_obs_weights(d)[0], u)
+        # replaced without going through SepiaData (the old K may be freed and its id reused)
+        d.obs_data.K = 2 * d.obs_data.K
+        u2, _ = _obs_weights(d)
+        self.assertTrue(np.allclose(u2, u / 2))
+
+    def test_K_basis_cache(self):
+        """
+        Tests that repeated create_K_basis calls on the same y_std reuse its decompositions and give the uncached basis.
+        """
+        import pickle
+        np.random.seed(42)
+        for m, ell in [(100, 20), (10, 20), (150, 200)]:
+            y_ind = np.linspace(0, 1, ell)
+            t = np.random.uniform(0, 1, (m, 2))
+            y = np.sin(4 * t[:, 0:1] + 6 * y_ind[None, :]) * t[:, 1:2] + 0.1 * np.random.normal(size=(m, ell))
+            d = SepiaData(t_sim=t, y_sim=y, y_ind_sim=y_ind)
+            d.standardize_y()
+            d.create_K_basis(0.95)
+            K = d.sim_data.K
+            decomps = d.sim_data._pca_cache[1]
+            n_decomps = len(decomps)
+            d.create_K_basis(0.95)
+            self.assertTrue(np.array_equal(d.sim_data.K, K))
+            self.assertTrue(d.sim_data._pca_cache[1] is decomps)
+            self.assertEqual(len(decomps), n_decomps)
+            d2 = pickle.loads(pickle.dumps(d))
+            self.assertIsNone(d2.sim_data._pca_cache)
+            d.standardize_y()
+            self.assertIsNone(d.sim_data._pca_cache)
+            d.create_K_basis(0.95)
+            self.assertTrue(np.array_equal(d.sim_data.K, K))
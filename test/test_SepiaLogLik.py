@@ -125,7 +125,32 @@ class SepiaLogLikTestCase(unittest.TestCase):
             for cindex in range(int(np.prod(param.val_shape))):
                 model.logLik(cvar=param.name, cindex=cindex)
 
+    def test_multivariate_sim_and_obs_log_post_batch(self):
+        """
+        Tests batched log posterior over theta against single evaluations
+        """
 
+        d = SepiaData(t_sim=self.multi_data_dict['t_sim'], y_sim=self.multi_data_dict['y_sim'],
+                      y_ind_sim=self.multi_data_dict['y_ind_sim'], y_obs=self.multi_data_dict['y_obs'],
+                      y_ind_obs=self.multi_data_dict['y_ind_obs'])
+        print('Testing multivariate sim and obs log_post_batch...', flush=True)
 
-
-
+        d.transform_xt()
+        d.standardize_y()
+        d.create_K_basis(5)
+        d.create_D_basis('linear')
+        model = SepiaModel(d)
+        lp0 = model.logPost()
+        theta0 = model.params.theta.val.copy()
+
+        theta = np.random.uniform(0, 1, (6, theta0.shape[1]))
+        theta[-1, 0] = 1.5 # out of bounds
+        lp = model.log_post_batch(theta)
+        self.assertEqual(lp.shape, (6,))
+        self.assertEqual(lp[-1], -np.inf)
+        # model state is unchanged
+        self.assertTrue(np.array_equal(model.params.theta.val, theta0))
+        self.assertTrue(np.allclose(model.logPost(cvar='theta'), lp0))
+        for i in range(5):
+            model.params.theta.val = theta[i][None, :]
+            self.assertTrue(np.allclose(lp[i], model.logPost()))
@@ -136,6 +136,28 @@ class SepiaMCMCTestCase(unittest.TestCase):
         samples = model.get_samples()
         self.assertTrue(np.all(samples['theta'][:, 0] + samples['theta'][:, 1] < 0.8))
 
+    def test_mcmc_draws_storage(self):
+        """
+        Tests that recorded draws are independent, survive pickling, and are cleared with the samples
+        """
+        import pickle
 
+        print('Testing SepiaMCMC draws storage...', flush=True)
 
-
+        model = self.multi_sim_and_obs_model
+        model.do_mcmc(30)
+        model.do_mcmc(10, no_init=True)
+        self.assertEqual(model.get_num_samples(), 40)
+        theta = model.params.theta.mcmc_to_array()
+        # draws are snapshots, not the current value
+        model.params.theta.val[0, 0] = -1.
+        self.assertTrue(np.array_equal(model.params.theta.mcmc_to_array(), theta))
+        # flattening is column major for matrix parameters
+        betaU = model.params.betaU
+        self.assertTrue(np.array_equal(betaU.mcmc_to_array()[5], betaU.mcmc.draws[5].flatten(order='F')))
+        model2 = pickle.loads(pickle.dumps(model))
+        self.assertTrue(np.array_equal(model2.params.theta.mcmc_to_array(), theta))
+        model2.do_mcmc(5, no_init=True)
+        self.assertEqual(model2.get_num_samples(), 45)
+        model.clear_samples()
+        self.assertEqual(model.get_num_samples(), 0)
@@ -105,3 +105,60 @@ class SepiaSensitivityTestCase(unittest.TestCase):
 
 
 
+    def test_varf(self):
+        """
+        Tests the vectorized varf against an elementwise construction from the C2 row layout
+        """
+        from sepia.SepiaSensitivity import varf
+        m, p = 6, 3
+        rs = np.random.RandomState(0)
+        C2 = rs.uniform(0.5, 1, (int(m*(m+1)/2) + m, p))
+        ef = rs.uniform(0.5, 1, m)
+        for Js in [[], [1], (0, 2), np.arange(p)]:
+            ll = np.setxor1d(np.arange(p), Js)
+            Vf = np.zeros((m, m))
+            kk = 0
+            for ii in range(m):
+                for jj in range(ii+1, m):
+                    Vf[ii, jj] = Vf[jj, ii] = np.prod(C2[kk, list(Js)]) * np.prod(ef[[ii, jj]]) ** (len(ll) > 0)
+                    kk += 1
+            for ii in range(m):
+                kk += 1
+                Vf[ii, ii] = np.prod(C2[kk, list(Js)]) * ef[ii] ** (2 * (len(ll) > 0))
+            self.assertTrue(np.allclose(varf(m, p, Js, C2, ef), Vf))
+            # a reused (dirty) output buffer is fully overwritten
+            out = np.full((m, m), np.nan)
+            self.assertIs(varf(m, p, Js, C2, ef, out=out), out)
+            self.assertTrue(np.allclose(out, Vf))
+
+    def test_varf_trace(self):
+        """
+        Tests the varf trace (compiled kernel if numba is installed) and the kernel body run as plain Python against the
+        trace of the varf matrix
+        """
+        from sepia.SepiaSensitivity import varf, _varf_trace
+        from sepia._kernels import _varf_trace_loop
+        m, p = 6, 3
+        rs = np.random.RandomState(0)
+        C2 = rs.uniform(0.5, 1, (int(m*(m+1)/2) + m, p))
+        ef = rs.uniform(0.5, 1, m)
+        A = rs.uniform(-1, 1, (m, m))
+        P = A @ A.T
+        My = rs.uniform(-1, 1, m)
+        ind = np.triu_indices(m, k=1)
+        for Js in [[], [1], (0, 2), np.arange(p)]:
+            Q = P - np.outer(My, My)
+            tr = np.trace(Q @ varf(m, p, Js, C2, ef, ind))
+            self.assertTrue(np.isclose(_varf_trace(P, My, m, p, Js, C2, ef, ind), tr))
+            ef_k = ef if len(np.setxor1d(np.arange(p), Js)) != 0 else np.empty(0)
+            self.assertTrue(np.isclose(_varf_trace_loop(C2, np.asarray(Js, dtype=np.intp), ef_k, ind[0], ind[1], P, My), tr))
+
+    def test_joint_effect_all_vars(self):
+        """
+        Tests that the joint effect index of all variables is one, and that interaction indices are bounded
+        """
+        model = self.univ_sim_only_model
+        model.do_mcmc(20)
+        sens = sensitivity(model, varlist='all', jelist=[(0, 1)])
+        self.assertTrue(np.isclose(sens['sjePm'], 1))
+        self.assertTrue(np.all(np.abs(sens['siePm']) <= 1))
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import numpy as np
 
@@ -10,6 +12,9 @@ np.random.seed(42)
 class SepiaSaveLoadTestCase(unittest.TestCase):
 
     def setUp(self, m=100, n=1, nt_sim=50, nt_obs=20, n_theta=3, n_basis=5, sig_n=0.1, seed=42):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.file_name = os.path.join(tmp_dir.name, 'saved_model_info')
         multi_data_dict = generate_data.generate_multi_sim_and_obs(m=m, n=n, nt_sim=nt_sim, nt_obs=nt_obs,
                                                                    n_theta=n_theta, n_basis=n_basis,
                                                                    sig_n=sig_n, seed=seed)
@@ -61,10 +66,10 @@ class SepiaSaveLoadTestCase(unittest.TestCase):
         model = SepiaModel(data)
         model.tune_step_sizes(50, 10)
         model.do_mcmc(100)
-        model.save_model_info(overwrite=True)
+        model.save_model_info(file_name=self.file_name, overwrite=True)
 
         new_model = SepiaModel(data)
-        new_model.restore_model_info()
+        new_model.restore_model_info(file_name=self.file_name)
 
         # check num stuff
         self.assertEqual(model.num.logLik, new_model.num.logLik)
@@ -99,10 +104,10 @@ class SepiaSaveLoadTestCase(unittest.TestCase):
         model = SepiaModel(data)
         model.tune_step_sizes(50, 10)
         model.do_mcmc(100)
-        model.save_model_info(overwrite=True)
+        model.save_model_info(file_name=self.file_name, overwrite=True)
 
         new_model = SepiaModel(data)
-        new_model.restore_model_info()
+        new_model.restore_model_info(file_name=self.file_name)
 
         # check num stuff
         self.assertEqual(model.num.logLik, new_model.num.logLik)
@@ -136,10 +141,10 @@ class SepiaSaveLoadTestCase(unittest.TestCase):
         model = SepiaModel(data)
         model.tune_step_sizes(50, 10)
         model.do_mcmc(100)
-        model.save_model_info(overwrite=True)
+        model.save_model_info(file_name=self.file_name, overwrite=True)
 
         new_model = SepiaModel(data)
-        new_model.restore_model_info()
+        new_model.restore_model_info(file_name=self.file_name)
 
         # check num stuff
         self.assertEqual(model.num.logLik, new_model.num.logLik)
@@ -173,10 +178,10 @@ class SepiaSaveLoadTestCase(unittest.TestCase):
         model = SepiaModel(data)
         model.tune_step_sizes(20, 5)
         model.do_mcmc(20)
-        model.save_model_info(overwrite=True)
+        model.save_model_info(file_name=self.file_name, overwrite=True)
 
         new_model = SepiaModel(data)
-        new_model.restore_model_info()
+        new_model.restore_model_info(file_name=self.file_name)
 
         # check num stuff
         self.assertEqual(model.num.logLik, new_model.num.logLik)
@@ -210,10 +215,10 @@ class SepiaSaveLoadTestCase(unittest.TestCase):
         model = SepiaModel(data)
         model.tune_step_sizes(20, 5)
         model.do_mcmc(20)
-        model.save_model_info(overwrite=True)
+        model.save_model_info(file_name=self.file_name, overwrite=True)
 
         new_model = SepiaModel(data)
-        new_model.restore_model_info()
+        new_model.restore_model_info(file_name=self.file_name)
 
         # check num stuff
         self.assertEqual(model.num.logLik, new_model.num.logLik)